@@ -0,0 +1,192 @@
+"""Бенчмарки конвейера отчета о продажах (агрегация, отбор позиций, ЕГАИС наименования, выгрузка в Excel,
+загрузка справочника ЕГАИС наименований) на синтетических данных. Сеть не нужна. Запуск из корня проекта:
+
+    python -m benchmarks.bench_report --sizes 1000 10000 100000 1000000 --output bench_new.json
+    python -m benchmarks.bench_report --compare bench_old.json bench_new.json
+
+Результаты сохраняются в json: для каждого этапа и размера данных лучшее время из --repeat запусков и пиковая
+память (tracemalloc) отдельного запуска.
+"""
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List
+
+from benchmarks.synthetic import make_egais_catalogue, make_mapping_table, make_products, make_retail_demands
+from konturmarket.konturmarket_class_lib import GoodEGAIS, load_egais_goods
+from moysklad.moysklad_class_lib import GoodsType, MoySklad
+from moysklad.moysklad_egais_mapping import build_lookup
+from utils.file_utils import build_excel, save_to_excel
+
+DEFAULT_SIZES = (1000, 10000, 100000, 1000000)
+DEFAULT_MAPPING_SIZES = (100, 1000, 10000, 100000)
+DEFAULT_CATALOGUE_SIZES = (10000, 30000, 100000)
+# Количество различных товаров в продажах
+DEFAULT_PRODUCTS = 500
+# Во сколько раз этап должен замедлиться, чтобы --compare считал это регрессией
+REGRESSION_THRESHOLD = 1.2
+
+
+@dataclass
+class BenchResult:
+    """Класс описывает результат замера одного этапа."""
+
+    stage: str  # этап конвейера
+    size: int  # размер данных: позиций, строк таблицы или товаров
+    seconds: float  # лучшее время из всех запусков, сек.
+    peak_memory: int  # пиковая память, байт
+
+
+def measure(stage: str, size: int, func: Callable[[], Any], repeat: int) -> BenchResult:
+    """Функция замеряет время и пиковую память выполнения func.
+    Память замеряется отдельным запуском, т.к. tracemalloc заметно замедляет выполнение."""
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    result = BenchResult(stage, size, min(times), peak)
+    print(f'{stage:<40} {size:>9} {result.seconds:>10.4f} s {peak / 2 ** 20:>10.2f} MiB', file=sys.stderr)
+    return result
+
+
+def run(sizes: List[int], mapping_sizes: List[int], catalogue_sizes: List[int], products_count: int,
+        repeat: int) -> List[BenchResult]:
+    """Функция запускает все этапы на данных всех размеров."""
+    ms = MoySklad()
+    products = make_products(products_count)
+    results = []
+
+    for size in sizes:
+        retail_demands = make_retail_demands(size, products)
+        positions = [position for retail_demand in retail_demands for position in retail_demand['positions']['rows']]
+        results.append(measure(
+            '_need_save_position', size,
+            lambda: [ms._need_save_position(GoodsType.alco, position) for position in positions],
+            repeat,
+        ))
+        results.append(measure(
+            '_get_goods_from_retail_demand', size,
+            lambda: ms._get_goods_from_retail_demand(GoodsType.alco, retail_demands),
+            repeat,
+        ))
+        results.append(measure(
+            '_get_goods_from_retail_demand columnar', size,
+            lambda: ms._get_goods_from_retail_demand(GoodsType.alco, retail_demands, columnar=True),
+            repeat,
+        ))
+
+    sold_goods = ms._get_goods_from_retail_demand(GoodsType.alco, make_retail_demands(100000, products))
+    for mapping_size in mapping_sizes:
+        mapping_table = make_mapping_table(mapping_size, products)
+        results.append(measure('build_lookup', mapping_size, lambda: build_lookup(mapping_table), repeat))
+        lookup = build_lookup(mapping_table)
+        results.append(measure(
+            '_fill_egais_name', mapping_size,
+            lambda: MoySklad._fill_egais_name(lookup, sold_goods),
+            repeat,
+        ))
+
+    results.append(measure('build_excel', len(sold_goods), lambda: build_excel(sold_goods), repeat))
+    with tempfile.TemporaryDirectory() as directory:
+        file_name = os.path.join(directory, 'Списание_ЕГАИС')
+        results.append(measure(
+            'save_to_excel', len(sold_goods),
+            lambda: save_to_excel(file_name, sold_goods, datetime.datetime.today()),
+            repeat,
+        ))
+
+    for catalogue_size in catalogue_sizes:
+        catalogue = make_egais_catalogue(catalogue_size)
+        results.append(measure(
+            'GoodEGAIS', catalogue_size,
+            lambda: [GoodEGAIS(**product_info) for product_info in catalogue],
+            repeat,
+        ))
+        results.append(measure('load_egais_goods', catalogue_size, lambda: load_egais_goods(catalogue), repeat))
+    return results
+
+
+def get_metadata() -> Dict[str, Any]:
+    """Функция возвращает описание окружения, в котором запускались бенчмарки."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'],
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = ''
+    return {
+        'commit': commit,
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
+
+
+def compare(old_file: str, new_file: str, threshold: float) -> int:
+    """Функция сравнивает два файла результатов и выводит отношение времени new/old по каждому этапу.
+
+    :return: 1, если хотя бы один этап замедлился больше, чем в threshold раз, иначе 0.
+    """
+    with open(old_file, 'r', encoding='utf-8') as file:
+        old = {(result['stage'], result['size']): result for result in json.load(file)['results']}
+    with open(new_file, 'r', encoding='utf-8') as file:
+        new = json.load(file)['results']
+
+    exit_code = 0
+    for result in new:
+        previous = old.get((result['stage'], result['size']))
+        if previous is None or not previous['seconds']:
+            continue
+        ratio = result['seconds'] / previous['seconds']
+        memory_ratio = result['peak_memory'] / previous['peak_memory'] if previous['peak_memory'] else 0
+        mark = ' РЕГРЕССИЯ' if ratio > threshold else ''
+        if mark:
+            exit_code = 1
+        print(f'{result["stage"]:<40} {result["size"]:>9} время x{ratio:.2f} память x{memory_ratio:.2f}{mark}')
+    return exit_code
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES),
+                        help='количество позиций в продажах')
+    parser.add_argument('--mapping-sizes', type=int, nargs='+', default=list(DEFAULT_MAPPING_SIZES),
+                        help='количество строк таблицы соответствий ЕГАИС')
+    parser.add_argument('--catalogue-sizes', type=int, nargs='+', default=list(DEFAULT_CATALOGUE_SIZES),
+                        help='количество товаров справочника ЕГАИС наименований')
+    parser.add_argument('--products', type=int, default=DEFAULT_PRODUCTS, help='количество различных товаров')
+    parser.add_argument('--repeat', type=int, default=3, help='количество запусков каждого этапа')
+    parser.add_argument('--output', default='bench_report.json', help='файл результатов')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='сравнить два файла результатов')
+    parser.add_argument('--threshold', type=float, default=REGRESSION_THRESHOLD,
+                        help='замедление, которое считается регрессией')
+    args = parser.parse_args()
+
+    if args.compare:
+        return compare(*args.compare, threshold=args.threshold)
+
+    results = run(args.sizes, args.mapping_sizes, args.catalogue_sizes, args.products, args.repeat)
+    with open(args.output, 'w', encoding='utf-8') as file:
+        json.dump({'metadata': get_metadata(), 'results': [asdict(result) for result in results]},
+                  file, ensure_ascii=False, indent=2)
+    print(f'Результаты сохранены в {args.output}', file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Модуль генерирует синтетические данные для бенчмарков: розничные продажи в формате ответа МойСклад
+(entity/retaildemand, позиции с раскрытым товаром), таблицы соответствий ЕГАИС и справочник ЕГАИС наименований
+Контур.Маркет."""
+import random
+from typing import Any, Dict, List
+
+BREWERIES = (
+    '4Пивовара', 'Aircraft', 'AF Brew', 'Бакунин', 'Salden\'s', 'Jaws', 'Stamm Beer', 'Zagovor', 'Gravity Project',
+    'Plan B', 'Konix', 'Red Button', 'Victory Art Brew', 'Rewort', 'Selfmade', 'Big Village',
+)
+STYLES = ('IPA', 'APA', 'Porter - American', 'Stout - Imperial', 'Sour - Fruited', 'Lager - Helles', 'Wheat Beer')
+WORDS = (
+    'Black', 'Jesus', 'White', 'Pepper', 'Рождественский', 'Эль', 'Hop', 'Juice', 'Tropical', 'Haze', 'Double',
+    'Dry', 'Milk', 'Cherry', 'Mango', 'Night', 'Северный', 'Ветер', 'Лес', 'Gose', 'Берлинер', 'Vanilla',
+)
+
+# Доли товаров по типам: алкоголь фасованный, разливное пиво, не алкоголь
+ALCO_SHARE = 0.7
+DRAFT_SHARE = 0.2
+
+
+def make_products(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Функция генерирует товары (assortment) с наименованиями и дополнительными полями, как в сервисе.
+
+    :param count: Количество различных товаров.
+    :param seed: Зерно генератора случайных чисел.
+    """
+    rnd = random.Random(seed)
+    products = []
+    for i in range(count):
+        name = (
+            f'{rnd.choice(BREWERIES)} - {" ".join(rnd.sample(WORDS, rnd.randint(1, 3)))} {i} '
+            f'({rnd.choice(STYLES)}. OG {rnd.randint(10, 30)}, ABV {rnd.randint(30, 120) / 10}%, '
+            f'IBU {rnd.randint(5, 100)})'
+        )
+        kind = rnd.random()
+        if kind < DRAFT_SHARE:
+            # разливное пиво: "Розлив" = Да, "Алкогольная продукция" = True
+            attributes = [
+                {'id': 'draft', 'name': 'Розлив', 'value': rnd.choice(('Да', 'да'))},
+                {'id': 'alco', 'name': 'Алкогольная продукция', 'value': True},
+            ]
+        elif kind < DRAFT_SHARE + ALCO_SHARE:
+            attributes = [{'id': 'alco', 'name': 'Алкогольная продукция', 'value': True}]
+            if rnd.random() < 0.3:
+                attributes.insert(0, {'id': 'draft', 'name': 'Розлив', 'value': rnd.choice(('Нет', 'нет', ''))})
+        else:
+            attributes = [{'id': 'alco', 'name': 'Алкогольная продукция', 'value': False}]
+        products.append({
+            'id': f'product-{i}',
+            'name': name,
+            'pathName': 'Пиво',
+            'attributes': attributes,
+        })
+    return products
+
+
+def make_retail_demands(positions: int, products: List[Dict[str, Any]], seed: int = 0) -> List[Dict[str, Any]]:
+    """Функция генерирует розничные продажи с заданным общим количеством позиций.
+    Чтобы миллион позиций помещался в память, документы ссылаются на общий пул словарей позиций: агрегация позиции
+    не изменяет, поэтому на результат это не влияет.
+
+    :param positions: Общее количество позиций во всех продажах.
+    :param products: Товары, см. make_products.
+    :param seed: Зерно генератора случайных чисел.
+    """
+    rnd = random.Random(seed)
+    pool = [
+        {
+            'quantity': float(rnd.choice((1, 1, 1, 2, 2, 3, 4))),
+            'price': float(rnd.randint(150, 900) * 100),
+            'assortment': rnd.choice(products),
+        }
+        for _ in range(min(positions, 10000))
+    ]
+    retail_demands = []
+    created = 0
+    while created < positions:
+        size = min(rnd.randint(1, 6), positions - created)
+        retail_demands.append({
+            'id': f'demand-{len(retail_demands)}',
+            'positions': {'rows': [pool[(created + i) % len(pool)] for i in range(size)]},
+        })
+        created += size
+    return retail_demands
+
+
+def make_mapping_table(rows: int, products: List[Dict[str, Any]], seed: int = 0) -> List[List[str]]:
+    """Функция генерирует таблицу соответствий коммерческое наименование - наименование ЕГАИС, как ее отдает
+    GoogleSheets. В таблицу попадают все товары (наименования в другом регистре) и дополнительные строки.
+
+    :param rows: Количество строк таблицы.
+    :param products: Товары, см. make_products.
+    :param seed: Зерно генератора случайных чисел.
+    """
+    rnd = random.Random(seed)
+    table = []
+    for product in products[:rows]:
+        name = product['name'].split(' (')[0]
+        egais_name = f'Пиво "{name}" {rnd.randint(1, 9)},{rnd.randint(0, 9)}%'
+        table.append([name.lower() if rnd.random() < 0.5 else name, egais_name])
+    for i in range(len(table), rows):
+        table.append([f'Товар из архива {i}', f'Пиво архивное {i}'] if rnd.random() < 0.95 else [f'Без пары {i}'])
+    rnd.shuffle(table)
+    return table
+
+
+def make_egais_catalogue(count: int, seed: int = 0) -> List[Dict[str, Any]]:
+    """Функция генерирует описания товаров справочника ЕГАИС наименований (productInfo), как их отдает Контур.Маркет
+    (Rests/List). У разливного пива нет емкости тары.
+
+    :param count: Количество товаров.
+    :param seed: Зерно генератора случайных чисел.
+    """
+    rnd = random.Random(seed)
+    catalogue = []
+    for i in range(count):
+        brewery = rnd.choice(BREWERIES)
+        product_info = {
+            'fullName': f'Пиво "{brewery} {" ".join(rnd.sample(WORDS, rnd.randint(1, 3)))} {i}" '
+                        f'{rnd.randint(3, 12)},{rnd.randint(0, 9)}%',
+            'egaisCode': f'{rnd.randint(1, 10 ** 12):019d}',
+            'producer': {'shortName': brewery, 'inn': f'{rnd.randint(10 ** 9, 10 ** 10 - 1)}'},
+            'productVCode': '261',
+        }
+        if rnd.random() > DRAFT_SHARE:
+            product_info['capacity'] = rnd.choice((0.33, 0.44, 0.5, 0.75))
+        catalogue.append(product_info)
+    return catalogue
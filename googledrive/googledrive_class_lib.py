@@ -1,7 +1,9 @@
 """Модуль для работы с Google Sheets"""
+import hashlib
 import os
-from dataclasses import dataclass
-from typing import Any, List
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, NamedTuple, Sequence, Tuple
 
 import googleapiclient.discovery  # pip install google-api-python-client
 import httplib2  # pip install httplib2
@@ -9,16 +11,38 @@ from googleapiclient.errors import HttpError
 from oauth2client.service_account import ServiceAccountCredentials
 
 import googledrive.googlesheets_vars as gs_vars
+import utils.file_cache as file_cache
+from googledrive.googlesheets_diff import get_column_number, get_sheet_diff, split_cell
 
 import logging.config
 
 import logger_config
+from utils.async_client import AsyncClient
+from utils.registry import GOOGLESHEETS, registry
 
 
 logging.config.dictConfig(logger_config.LOGGING_CONF)
 # Логгер для GoogleDrive
 gs_logger = logging.getLogger('google')
 
+# Файл с копией листа после последней записи send_data_diff
+SHEET_COPY_FILE = 'googlesheets_{}.json'
+
+
+class SheetRange(NamedTuple):
+    """Класс описывает диапазон листа таблицы GoogleSheets для чтения."""
+
+    spreadsheets_id: str  # id таблицы в Google Sheets
+    list_name: str  # текстовое имя листа
+    list_range: str  # диапазон A1:H100. Диапазон A1:H - до последней заполненной строки
+    # Типы значений столбцов диапазона по порядку (str, int, float...). Значения остальных столбцов остаются строками
+    column_types: Tuple[Callable[[str], Any], ...] = ()
+
+
+# Лист "Соответсвия ЕГАИС": коммерческое наименование, ЕГАИС наименование
+EGAIS_MAPPING_RANGE = SheetRange(gs_vars.SPREEDSHEET_ID_EGAIS, gs_vars.LIST_NAME_EGAIS,
+                                 f'{gs_vars.FIRST_CELL_EGAIS}:{gs_vars.LAST_COLUMN_EGAIS}')
+
 
 @dataclass
 class GoogleSheets:
@@ -26,8 +50,13 @@ class GoogleSheets:
 
     # Cервисный объект для работы с Google API.
     service: Any = None
+    # Сервисный объект для работы с Google Drive API (метаданные файлов).
+    drive_service: Any = None
     # Переменная устанавливается в True, в случае успешного логина в сервисе.
     connection_OK: bool = False
+    # httplib2.Http, через который работают service и drive_service, нельзя использовать из нескольких потоков
+    # одновременно, а GoogleSheets вызывается из потоков бота и заданий, поэтому запросы выполняются по одному
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
 
     def get_access(self) -> bool:
         """"Метод получения доступа сервисного объекта Google API
@@ -43,6 +72,7 @@ class GoogleSheets:
         http_auth = credentials.authorize(httplib2.Http())
         try:
             self.service = googleapiclient.discovery.build('sheets', 'v4', http=http_auth)
+            self.drive_service = googleapiclient.discovery.build('drive', 'v3', http=http_auth)
             gs_logger.debug('Получили доступ к Google API')
             self.connection_OK = True
 
@@ -56,26 +86,68 @@ class GoogleSheets:
         :param spreadsheets_id: id таблицы в Google Sheets
         :param list_name: текстовое имя листа
         :param list_range: запрашиваемый диапазон A1:H100
-        :return: Возвращает список списков [[], []..]. Каждый элемент списка - список из 2 элементов. 1 - коммерческое
-                название, 2 - наименование ЕГАИС. Пустой список в случае не удачи
+        :return: Возвращает список списков [[], []..] - строки диапазона в порядке таблицы, без пустых строк.
+                Пустой список в случае не удачи
         """
         if not spreadsheets_id or not list_name or not list_range:
             return []
 
-        values = self.service.spreadsheets().values().get(spreadsheetId=spreadsheets_id,
-                                                          range=f'{list_name}!{list_range}',
-                                                          majorDimension='ROWS').execute()
-        if not values['values']:
-            return []
+        return self.get_many([SheetRange(spreadsheets_id, list_name, list_range)])[0]
+
+    def get_many(self, ranges: Sequence[SheetRange]) -> List[List[List[Any]]]:
+        """Метод получения данных нескольких диапазонов. Диапазоны одной таблицы читаются одним запросом
+        values().batchGet, поэтому листы одной таблицы читаются за один запрос.
+        :param ranges: Диапазоны для чтения.
+        :return: Строки каждого диапазона в порядке ranges, см. _get_rows. Для диапазонов таблицы, которую
+                не удалось прочитать, - пустой список
+        """
+        result: List[List[List[Any]]] = [[] for _ in ranges]
+        # Номера диапазонов по таблице
+        spreadsheets: Dict[str, List[int]] = {}
+        for index, sheet_range in enumerate(ranges):
+            spreadsheets.setdefault(sheet_range.spreadsheets_id, []).append(index)
 
-        # googlesheets отдает диапазон, отсекая в запрашиваемом диапазоне пустые ячейки снизу, но пустые строки
-        # могут оказаться в середине текста
-        # отсортируем, чтобы пустые строки оказались вверху, а потом удалим их
-        values = sorted(values['values'])
-        i = 0
-        while not values[i]:
-            i += 1
-        return values[i:]
+        for spreadsheets_id, indexes in spreadsheets.items():
+            try:
+                response = self._execute(self.service.spreadsheets().values().batchGet(
+                    spreadsheetId=spreadsheets_id,
+                    ranges=[f'{ranges[index].list_name}!{ranges[index].list_range}' for index in indexes],
+                    majorDimension='ROWS'))
+            except HttpError as error:
+                gs_logger.error(f'Не удалось прочитать таблицу {spreadsheets_id}: {error}')
+                continue
+            # Диапазоны в ответе идут в порядке запроса
+            for index, value_range in zip(indexes, response.get('valueRanges', [])):
+                result[index] = _get_rows(value_range.get('values', []), ranges[index].column_types)
+        return result
+
+    def get_modified_time(self, spreadsheets_id: str) -> str:
+        """Метод получения времени последнего изменения таблицы GoogleSheets. Запрос легкий, в ответе только
+        одно поле, поэтому его удобно использовать для проверки, изменилась ли таблица.
+        :param spreadsheets_id: id таблицы в Google Sheets
+        :return: Время изменения в формате RFC 3339. Пустая строка в случае ошибки.
+        """
+        if not spreadsheets_id or self.drive_service is None:
+            return ''
+        try:
+            metadata = self._execute(self.drive_service.files().get(fileId=spreadsheets_id, fields='modifiedTime'))
+        except HttpError as error:
+            gs_logger.error(f'Не удалось получить время изменения таблицы {spreadsheets_id}: {error}')
+            return ''
+        return metadata.get('modifiedTime', '')
+
+    def is_sheet_changed(self, spreadsheets_id: str, list_name: str) -> bool:
+        """Метод проверяет, менялась ли таблица после последней записи листа методом send_data_diff, например,
+        вручную. Сравнивается время изменения таблицы со временем из копии листа.
+        :param spreadsheets_id: id таблицы в Google Sheets
+        :param list_name: Текстовое имя листа.
+        :return: False, если таблица не менялась. True, если менялась, копии листа нет или время изменения
+                не удалось получить.
+        """
+        sheet_copy = file_cache.read_json(get_sheet_copy_file(spreadsheets_id, list_name))
+        if not isinstance(sheet_copy, dict) or not sheet_copy.get('modified_time'):
+            return True
+        return self.get_modified_time(spreadsheets_id) != sheet_copy['modified_time']
 
     def send_data(self, data: List[Any], spreadsheets_id: str, list_name: str, list_range: str) -> bool:
         """Метод записи данных в таблицу GoogleSheets.
@@ -88,32 +160,131 @@ class GoogleSheets:
 
         # В начале очищаем диапазон.
         # https://developers.google.com/sheets/api/reference/rest/v4/spreadsheets.values/clear?hl=ru
-        self.service.spreadsheets().values().clear(spreadsheetId=spreadsheets_id,
-                                                   range=f'{list_name}!{list_range}',
-                                                   body={}).execute()
+        self._execute(self.service.spreadsheets().values().clear(spreadsheetId=spreadsheets_id,
+                                                                 range=f'{list_name}!{list_range}',
+                                                                 body={}))
         # Записываем данные
         try:
-            self.service.spreadsheets().values().batchUpdate(spreadsheetId=spreadsheets_id,
-                                                         body={
-                                                             "valueInputOption": "USER_ENTERED",
-                                                             "data":
-                                                                 [
-                                                                     {
-                                                                         "range": f'{list_name}!{list_range}',
-                                                                         "majorDimension": "ROWS",
-                                                                         "values": data
-                                                                     }
-                                                                 ]
-                                                         }).execute()
+            self._execute(self.service.spreadsheets().values().batchUpdate(spreadsheetId=spreadsheets_id, body={
+                "valueInputOption": "USER_ENTERED",
+                "data": [{"range": f'{list_name}!{list_range}', "majorDimension": "ROWS", "values": data}],
+            }))
             return True
         except HttpError:
             return False
 
+    def _execute(self, request: Any) -> Any:
+        """Метод выполняет запрос к Google API. Одновременно выполняется только один запрос, см. _lock."""
+        with self._lock:
+            return request.execute()
+
+    def send_data_diff(self, data: List[Any], spreadsheets_id: str, list_name: str, first_cell: str,
+                       last_column: str, key_column: int) -> bool:
+        """Метод записи данных в таблицу GoogleSheets по разнице с текущим содержимым листа. В отличие от send_data
+        лист не очищается и не перезаписывается целиком: строки сопоставляются по ключевому столбцу, и одним запросом
+        batchUpdate записываются только добавленные, измененные и удаленные (очищаются) строки, см.
+        googlesheets_diff.get_sheet_diff. Новые строки занимают освободившиеся строки, затем добавляются в конец,
+        поэтому порядок строк листа не сохраняет порядок data (сортировку по пивоварне и т.п.).
+
+        Текущее содержимое листа берется из копии, сохраненной после прошлой записи, если таблица с тех пор
+        не менялась (по времени изменения), иначе читается из таблицы.
+        :param data: Данные для записи.
+        :param spreadsheets_id: id таблицы в Google Sheets
+        :param list_name: Текстовое имя листа.
+        :param first_cell: Первая ячейка данных, A2.
+        :param last_column: Последний столбец данных, D.
+        :param key_column: Номер ключевого столбца в строке данных, с 0.
+        :return: Возвращает True в случае удачной записи или если записывать нечего, False в случае ошибки.
+        """
+        first_column, first_row = split_cell(first_cell)
+        width = get_column_number(last_column) - get_column_number(first_column) + 1
+        copy_file = get_sheet_copy_file(spreadsheets_id, list_name)
+
+        modified_time = self.get_modified_time(spreadsheets_id)
+        sheet_copy = file_cache.read_json(copy_file)
+        if modified_time and isinstance(sheet_copy, dict) and sheet_copy.get('modified_time') == modified_time:
+            current = sheet_copy['rows']
+        else:
+            try:
+                values = self._execute(self.service.spreadsheets().values().get(
+                    spreadsheetId=spreadsheets_id,
+                    range=f'{list_name}!{first_cell}:{last_column}',
+                    majorDimension='ROWS'))
+            except HttpError as error:
+                gs_logger.error(f'Не удалось прочитать лист {list_name}: {error}')
+                return False
+            current = values.get('values', [])
+
+        diff = get_sheet_diff(current, data, key_column, width)
+        if diff.updates:
+            ranges = [
+                {
+                    "range": f'{list_name}!{first_column}{first_row + start}:'
+                             f'{last_column}{first_row + start + len(rows) - 1}',
+                    "majorDimension": "ROWS",
+                    "values": rows,
+                }
+                for start, rows in diff.get_ranges()
+            ]
+            try:
+                self._execute(self.service.spreadsheets().values().batchUpdate(spreadsheetId=spreadsheets_id, body={
+                    "valueInputOption": "USER_ENTERED",
+                    "data": ranges,
+                }))
+            except HttpError as error:
+                # Что успело записаться, неизвестно, поэтому в следующий раз лист будет прочитан из таблицы
+                file_cache.remove(copy_file)
+                gs_logger.error(f'Не удалось записать данные в лист {list_name}: {error}')
+                return False
+            modified_time = self.get_modified_time(spreadsheets_id)
+
+        gs_logger.info(f'Лист {list_name}: добавлено строк {diff.inserted}, изменено {diff.changed}, '
+                       f'удалено {diff.deleted}')
+        file_cache.write_json(copy_file, {'modified_time': modified_time, 'rows': diff.rows})
+        return True
+
+
+def get_sheet_copy_file(spreadsheets_id: str, list_name: str) -> str:
+    """Функция возвращает имя файла с копией листа, которую сохраняет send_data_diff."""
+    return SHEET_COPY_FILE.format(hashlib.sha1(f'{spreadsheets_id}!{list_name}'.encode()).hexdigest())
+
+
+def _get_rows(values: List[List[str]], column_types: Tuple[Callable[[str], Any], ...]) -> List[List[Any]]:
+    """Функция убирает пустые строки диапазона и приводит значения столбцов к типам column_types. Значение, которое
+    не удалось привести к типу, остается строкой.
+
+    googlesheets отдает диапазон, отсекая пустые строки снизу, но пустые строки могут оказаться в середине.
+    Они удаляются за один проход, порядок остальных строк сохраняется.
+    """
+    if not column_types:
+        return [row for row in values if row]
+
+    rows = []
+    for row in values:
+        if not row:
+            continue
+        typed_row: List[Any] = list(row)
+        for index, column_type in enumerate(column_types[:len(row)]):
+            try:
+                typed_row[index] = column_type(row[index])
+            except (TypeError, ValueError):
+                pass
+        rows.append(typed_row)
+    return rows
+
+
+def _connect_googlesheets() -> GoogleSheets:
+    """Функция создает инстанс GoogleSheets и получает доступ к Google API."""
+    sheets = GoogleSheets()
+    sheets.get_access()
+    return sheets
 
 
 # Создаем инстанс GoogleSheets
-googlesheets = GoogleSheets()
-googlesheets.get_access()
+# Доступ к Google API запрашивается при первом обращении к googlesheets, а не при импорте модуля
+googlesheets = registry.register(GOOGLESHEETS, _connect_googlesheets)
+# Асинхронный вариант googlesheets, методы вызываются через await
+googlesheets_async = AsyncClient(googlesheets)
 
 if __name__ == '__main__':
     gs = GoogleSheets()
@@ -0,0 +1,136 @@
+"""Модуль описывает вычисление разницы между строками листа GoogleSheets и новыми данными. Строки сопоставляются
+по ключевому столбцу, поэтому в таблицу записываются только добавленные, измененные и удаленные строки, а не весь
+лист."""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Sequence, Tuple
+
+# Строка листа: значения ячеек в том виде, как их показывает GoogleSheets
+Row = List[str]
+
+
+def get_cell_text(value: Any) -> str:
+    """Функция возвращает значение ячейки так, как его показывает GoogleSheets: без апострофа, которым значение
+    помечается как текст при записи (valueInputOption USER_ENTERED), и без пробелов по краям."""
+    text = str(value)
+    if text.startswith("'"):
+        text = text[1:]
+    return text.strip()
+
+
+def get_row_text(row: Sequence[Any], width: int) -> Row:
+    """Функция возвращает строку листа из width ячеек. GoogleSheets отдает строки без пустых ячеек в конце."""
+    cells = [get_cell_text(value) for value in row[:width]]
+    cells.extend([''] * (width - len(cells)))
+    return cells
+
+
+def split_cell(cell: str) -> Tuple[str, int]:
+    """Функция разбирает адрес ячейки A2 на столбец и номер строки: ('A', 2)."""
+    match = re.fullmatch(r'([A-Z]+)(\d+)', cell.upper())
+    if match is None:
+        raise ValueError(f'Неверный адрес ячейки: {cell}')
+    return match.group(1), int(match.group(2))
+
+
+def get_column_number(column: str) -> int:
+    """Функция возвращает номер столбца по его букве (A - 1, Z - 26, AA - 27)."""
+    number = 0
+    for letter in column.upper():
+        number = number * 26 + ord(letter) - ord('A') + 1
+    return number
+
+
+@dataclass
+class SheetDiff:
+    """Класс описывает разницу между строками листа и новыми данными."""
+
+    # Строки для записи по номеру строки в диапазоне (с 0). Удаленные строки записываются пустыми
+    updates: Dict[int, List[Any]] = field(default_factory=dict)
+    # Строки листа после записи
+    rows: List[Row] = field(default_factory=list)
+    inserted: int = 0  # количество добавленных строк
+    changed: int = 0  # количество измененных строк
+    deleted: int = 0  # количество удаленных строк
+
+    def get_ranges(self) -> List[Tuple[int, List[List[Any]]]]:
+        """Метод объединяет записываемые строки, идущие подряд, в диапазоны.
+
+        :return: Список (номер первой строки диапазона с 0, строки диапазона) по возрастанию номера строки.
+        """
+        ranges: List[Tuple[int, List[List[Any]]]] = []
+        for index in sorted(self.updates):
+            if ranges and ranges[-1][0] + len(ranges[-1][1]) == index:
+                ranges[-1][1].append(self.updates[index])
+            else:
+                ranges.append((index, [self.updates[index]]))
+        return ranges
+
+
+def get_sheet_diff(current: Sequence[Sequence[Any]], data: Iterable[Sequence[Any]], key_index: int,
+                   width: int) -> SheetDiff:
+    """Функция сравнивает строки листа с новыми данными по ключевому столбцу.
+
+    Измененная строка перезаписывается на своем месте. Строка, ключа которой нет в новых данных, освобождается,
+    как и пустые строки и строки с повторным ключом. Новые строки занимают освободившиеся строки по порядку, затем
+    добавляются в конец, оставшиеся освободившиеся строки очищаются. Поэтому порядок строк листа не повторяет
+    порядок data: лист, отсортированный при полной записи (например, по пивоварне), после добавлений перестает
+    быть отсортированным. Это плата за запись только изменившихся строк.
+
+    :param current: Текущие строки листа.
+    :param data: Новые строки. Строки без ключа и с повторным ключом пропускаются.
+    :param key_index: Номер ключевого столбца в строке, с 0.
+    :param width: Количество столбцов диапазона.
+    """
+    diff = SheetDiff(rows=[get_row_text(row, width) for row in current])
+    rows = diff.rows
+    # Номер строки листа по ключу и освободившиеся строки
+    positions: Dict[str, int] = {}
+    free: List[int] = []
+    for index, row in enumerate(rows):
+        key = row[key_index]
+        if key and key not in positions:
+            positions[key] = index
+        else:
+            free.append(index)
+
+    inserted: List[Tuple[List[Any], Row]] = []
+    seen = set()
+    for values in data:
+        text = get_row_text(values, width)
+        key = text[key_index]
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        values = list(values[:width]) + [''] * (width - len(values))
+        index = positions.pop(key, None)
+        if index is None:
+            inserted.append((values, text))
+        elif rows[index] != text:
+            diff.updates[index] = values
+            rows[index] = text
+            diff.changed += 1
+
+    # Ключи, которых нет в новых данных, удалены
+    diff.deleted = len(positions)
+    free.extend(positions.values())
+    free.sort()
+    for slot, (values, text) in enumerate(inserted):
+        if slot < len(free):
+            index = free[slot]
+            rows[index] = text
+        else:
+            index = len(rows)
+            rows.append(text)
+        diff.updates[index] = values
+    diff.inserted = len(inserted)
+
+    blank = [''] * width
+    for index in free[len(inserted):]:
+        if rows[index] != blank:
+            diff.updates[index] = list(blank)
+            rows[index] = list(blank)
+    # GoogleSheets не отдает пустые строки в конце листа, поэтому и в строках листа их нет
+    while rows and rows[-1] == blank:
+        rows.pop()
+    return diff
@@ -0,0 +1,109 @@
+"""В модуле описан нечеткий поиск ЕГАИС наименований (справочник Контур.Маркет) по коммерческому наименованию
+товара. По справочнику один раз строится инвертированный индекс: триграмма - номера наименований, в которых она
+встречается. Для поиска считается количество общих с запросом триграмм только по спискам триграмм запроса (numpy),
+без попарного сравнения запроса со всем справочником, и наименования ранжируются по коэффициенту Дайса."""
+import re
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, FrozenSet, Iterable, List, NamedTuple
+
+import numpy as np
+
+if TYPE_CHECKING:
+    # Индекс хранится в KonturMarket, поэтому модель импортируется только для проверки типов
+    from konturmarket.konturmarket_class_lib import GoodEGAIS
+
+# Количество кандидатов по умолчанию
+CANDIDATES_LIMIT = 5
+# Минимальный коэффициент Дайса, при котором наименование считается кандидатом
+MIN_SCORE = 0.3
+# Все, что не буква и не цифра, считается разделителем слов
+SEPARATORS = re.compile(r'[^\w]+|_')
+
+
+class EgaisCandidate(NamedTuple):
+    """Класс описывает кандидата в ЕГАИС наименования."""
+
+    name: str  # ЕГАИС наименование
+    alco_code: str  # код алкогольной продукции
+    brewery: str  # производитель
+    score: float  # коэффициент Дайса по триграммам, от 0 до 1
+
+
+def normalize(text: str) -> List[str]:
+    """Функция приводит строку к списку слов в нижнем регистре, без кавычек и знаков препинания."""
+    return SEPARATORS.sub(' ', text.lower().replace('ё', 'е')).split()
+
+
+def get_trigrams(text: str) -> FrozenSet[str]:
+    """Функция возвращает множество триграмм строки. Триграммы строятся по каждому слову, дополненному пробелами,
+    поэтому порядок слов не важен, а начало и конец слова весят больше."""
+    grams = set()
+    for word in normalize(text):
+        word = f' {word} '
+        grams.update(word[i:i + 3] for i in range(len(word) - 2))
+    return frozenset(grams)
+
+
+@dataclass
+class EgaisMatcher:
+    """Класс описывает индекс справочника ЕГАИС наименований для нечеткого поиска.
+
+    Индексируется ЕГАИС наименование вместе с наименованием производителя, т.к. коммерческое наименование обычно
+    начинается с пивоварни: 4Пивовара - Black Jesus White Pepper.
+    """
+
+    # Справочник ЕГАИС наименований
+    goods: List['GoodEGAIS'] = field(repr=False)
+    # Количество триграмм каждого наименования справочника
+    _sizes: np.ndarray = field(init=False, repr=False)
+    # Инвертированный индекс: триграмма - номера наименований справочника
+    _index: Dict[str, np.ndarray] = field(default_factory=dict, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        index: Dict[str, List[int]] = {}
+        sizes = []
+        for number, good in enumerate(self.goods):
+            grams = get_trigrams(f'{good.brewery.name} {good.name}')
+            sizes.append(len(grams))
+            for gram in grams:
+                index.setdefault(gram, []).append(number)
+        self._sizes = np.array(sizes, dtype=np.int32)
+        self._index = {gram: np.array(numbers, dtype=np.int32) for gram, numbers in index.items()}
+
+    def match(self, name: str, limit: int = CANDIDATES_LIMIT, min_score: float = MIN_SCORE) -> List[EgaisCandidate]:
+        """Метод возвращает кандидатов в ЕГАИС наименования для коммерческого наименования.
+
+        :param name: Коммерческое наименование.
+        :param limit: Максимальное количество кандидатов.
+        :param min_score: Минимальный коэффициент Дайса.
+        :return: Кандидаты по убыванию коэффициента. Пустой список, если похожих наименований нет.
+        """
+        grams = get_trigrams(name)
+        postings = [self._index[gram] for gram in grams if gram in self._index]
+        if not postings:
+            return []
+
+        # Количество общих с запросом триграмм у каждого наименования справочника
+        common = np.bincount(np.concatenate(postings), minlength=len(self.goods))
+        scores = 2 * common / (len(grams) + self._sizes)
+        # Наименований с коэффициентом не ниже min_score обычно единицы, сортируются только они
+        top = np.flatnonzero(scores >= min_score)
+        if len(top) > limit:
+            top = top[np.argpartition(scores[top], -limit)[-limit:]]
+        candidates = []
+        for number in top[np.argsort(-scores[top], kind='stable')]:
+            good = self.goods[number]
+            score = round(float(scores[number]), 3)
+            candidates.append(EgaisCandidate(good.name, good.alco_code, good.brewery.name, score))
+        return candidates
+
+    def match_many(self,
+                   names: Iterable[str],
+                   limit: int = CANDIDATES_LIMIT,
+                   min_score: float = MIN_SCORE,
+                   ) -> Dict[str, List[EgaisCandidate]]:
+        """Метод возвращает кандидатов для каждого коммерческого наименования, см. match.
+
+        :return: Словарь. Ключ - коммерческое наименование, значение - кандидаты.
+        """
+        return {name: self.match(name, limit, min_score) for name in names}
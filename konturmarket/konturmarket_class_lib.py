@@ -1,16 +1,28 @@
 """В модуле описаны классы для работы с сервисом Контур.Маркет https://market.kontur.ru/."""
 import json
-from dataclasses import dataclass
-from typing import List, Tuple, Optional
+import logging
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple, Optional
 
 import privatedata.kontrurmarket_privatedata as km_pvdata
 import requests
 from pydantic import BaseModel, Field
 
+from konturmarket.egais_matcher import EgaisMatcher
+from konturmarket.konturmarket_snapshot import AssortmentDiff, AssortmentSnapshot
 from konturmarket.konturmarket_urls import Url, UrlType, get_url
+from utils.async_client import AsyncClient
+from utils.registry import KONTURMARKET, registry
+
+# Логгер для Контур.Маркет
+km_logger = logging.getLogger('konturmarket')
 
 session = requests.Session()
 
+# Количество описаний товаров, которые при массовой загрузке справочника проверяются полной валидацией pydantic
+BULK_VALIDATION_SAMPLE = 50
+
 
 class Brewery(BaseModel):
     """Клас описывает структуру компании производителя, продукции в соответствии с терминами ЕГАИС. Словарь
@@ -48,34 +60,139 @@ class GoodEGAIS(BaseModel):
         )
 
 
+def load_egais_goods(product_infos: List[Dict[str, Any]], sample_size: int = BULK_VALIDATION_SAMPLE) -> List[GoodEGAIS]:
+    """Функция массово создает инстансы GoodEGAIS из описаний товаров (productInfo).
+
+    Полная валидация pydantic (вместе с вложенной моделью Brewery) выполняется только для выборки из sample_size
+    описаний, равномерно по справочнику. Если для выборки результат быстрого создания (без валидации, см.
+    _construct_egais_good) совпадает с результатом валидации, остальные товары создаются без валидации. Описание,
+    поля которого отсутствуют или не тех типов, валидируется полностью. Если выборка не совпала (изменилась модель
+    или формат ответа сервиса), валидируются все описания.
+
+    :param product_infos: Описания товаров, как их отдает сервис.
+    :param sample_size: Размер выборки для полной валидации.
+    """
+    step = max(1, len(product_infos) // max(1, sample_size))
+    for product_info in product_infos[::step]:
+        good = _construct_egais_good(product_info)
+        if good is not None and good != GoodEGAIS(**product_info):
+            return [GoodEGAIS(**product_info) for product_info in product_infos]
+
+    return [_construct_egais_good(product_info) or GoodEGAIS(**product_info) for product_info in product_infos]
+
+
+def _construct_egais_good(product_info: Dict[str, Any]) -> Optional[GoodEGAIS]:
+    """Функция создает GoodEGAIS без валидации, так же как BaseModel.construct, но без его накладных расходов.
+    None, если поля описания отсутствуют или не тех типов, которые получаются после валидации."""
+    try:
+        name = product_info['fullName']
+        alco_code = product_info['egaisCode']
+        brewery_name = product_info['producer']['shortName']
+    except (KeyError, TypeError):
+        return None
+    capacity = product_info.get('capacity')
+    if type(name) is not str or type(alco_code) is not str or type(brewery_name) is not str:
+        return None
+    if capacity is not None and type(capacity) is not float:
+        return None
+
+    brewery = Brewery.__new__(Brewery)
+    object.__setattr__(brewery, '__dict__', {'name': brewery_name})
+    object.__setattr__(brewery, '__fields_set__', {'name'})
+    good = GoodEGAIS.__new__(GoodEGAIS)
+    object.__setattr__(good, '__dict__', {'name': name, 'alco_code': alco_code, 'capacity': capacity,
+                                          'brewery': brewery})
+    object.__setattr__(good, '__fields_set__', {'name', 'alco_code', 'capacity', 'brewery'})
+    return good
+
+
 @dataclass()
 class KonturMarket:
     """Класс описывает работу с сервисом Контур.Маркет https://market.kontur.ru/."""
 
     # Переменная устанавливается в True, в случае успешного логина в сервисе
     connection_OK: bool = False
-
-    @staticmethod
-    def get_egais_assortment() -> List[GoodEGAIS]:
-        """Метод возвращает список инстансов GoodEGAIS, полученных из сервиса."""
-
-        goods_list: List[GoodEGAIS] = []
+    # Снимок справочника ЕГАИС наименований
+    snapshot: AssortmentSnapshot = field(default_factory=AssortmentSnapshot, repr=False)
+    # Справочник, построенный из снимка, и хэш снимка, из которого он построен
+    _egais_goods: List[GoodEGAIS] = field(default_factory=list, init=False, repr=False)
+    _egais_goods_hash: str = field(default='', init=False, repr=False)
+    # Индекс справочника для нечеткого поиска ЕГАИС наименований и хэш снимка, из которого он построен
+    _egais_matcher: Optional[EgaisMatcher] = field(default=None, init=False, repr=False)
+    _egais_matcher_hash: str = field(default='', init=False, repr=False)
+    # Задания выполняются одновременно, а запрос справочника и построение справочника и индекса меняют общее
+    # состояние (session, поля выше), поэтому они выполняются по одному. Блокировка повторная: get_egais_matcher
+    # вызывает get_egais_assortment, а тот - refresh_egais_assortment
+    _lock: threading.RLock = field(default_factory=threading.RLock, init=False, repr=False)
+
+    def get_egais_assortment(self, refresh: bool = True) -> List[GoodEGAIS]:
+        """Метод возвращает список инстансов GoodEGAIS, полученных из сервиса. Если справочник не изменился
+        с прошлого запроса, возвращается список, построенный в прошлый раз.
+
+        :param refresh: False - справочник строится из снимка без запроса к сервису, например, сразу после
+            get_egais_assortment_diff.
+        """
+        with self._lock:
+            if refresh and not self.refresh_egais_assortment():
+                return []
+
+            content_hash = self.snapshot.content_hash
+            if content_hash != self._egais_goods_hash:
+                # Сортировка по названию пивоварни
+                self._egais_goods = sorted(load_egais_goods(self.snapshot.products),
+                                           key=lambda element: element.brewery.name)
+                self._egais_goods_hash = content_hash
+            return list(self._egais_goods)
+
+    def get_egais_matcher(self, refresh: bool = True) -> Optional[EgaisMatcher]:
+        """Метод возвращает индекс справочника ЕГАИС наименований для нечеткого поиска. Индекс строится заново,
+        только если изменился справочник.
+
+        :param refresh: См. get_egais_assortment.
+        :return: Индекс справочника. None, если справочник получить не удалось.
+        """
+        with self._lock:
+            egais_goods = self.get_egais_assortment(refresh)
+            if not egais_goods:
+                return None
+            if self._egais_matcher is None or self._egais_matcher_hash != self._egais_goods_hash:
+                self._egais_matcher = EgaisMatcher(egais_goods)
+                self._egais_matcher_hash = self._egais_goods_hash
+            return self._egais_matcher
+
+    def get_egais_assortment_diff(self, consumer: str) -> Optional[AssortmentDiff]:
+        """Метод возвращает изменения справочника ЕГАИС наименований (коды алкогольной продукции) с момента, который
+        потребитель отметил обработанным (commit_egais_assortment_diff).
+
+        :param consumer: Имя потребителя (задания).
+        :return: Изменения справочника. None, если справочник получить не удалось.
+        """
+        if not self.refresh_egais_assortment():
+            return None
+        return self.snapshot.get_diff(consumer)
+
+    def commit_egais_assortment_diff(self, diff: AssortmentDiff) -> None:
+        """Метод отмечает изменения справочника обработанными потребителем diff.consumer."""
+        self.snapshot.commit(diff)
+
+    def refresh_egais_assortment(self) -> bool:
+        """Метод обновляет снимок справочника. Запрос условный (If-None-Match/If-Modified-Since), на ответ 304
+        снимок не меняется. Полученный справочник разбирается, только если он отличается от снимка.
+
+        :return: True, если снимок актуален, False в случае ошибки.
+        """
         url: Url = get_url(UrlType.egais_assortment)
-        response = session.get(url.url)
-
-        goods = dict(response.json()).get('list')
-        # Если получили успешный ответ и есть список товаров
-        if response.ok and goods:
-            # Проходим по всему списку товаров, наименований.
-            for good in goods:
-                # Получаем словарь с информацией о товаре
-                goods_list.append(GoodEGAIS(**good['productInfo']))
-
-            # Сортировка по названию пивоварни
-            goods_list = sorted(goods_list, key=lambda element: element.brewery.name)
-            return goods_list
-        else:
-            return []
+        with self._lock:
+            response = session.get(url.url, headers=self.snapshot.get_headers())
+            if response.status_code == 304:
+                km_logger.debug('Справочник ЕГАИС наименований не изменился')
+                return True
+            if not response.ok:
+                km_logger.error(f'Не удалось получить справочник ЕГАИС наименований: {response.status_code}')
+                return False
+            return self.snapshot.update(response.content,
+                                        etag=response.headers.get('ETag', ''),
+                                        last_modified=response.headers.get('Last-Modified', ''))
 
     def login(self) -> bool:
         auth_data = {
@@ -97,6 +214,15 @@ class KonturMarket:
         return response.ok
 
 
+def _connect_konturmarket() -> KonturMarket:
+    """Функция создает инстанс KonturMarket и логинится в сервисе."""
+    market = KonturMarket()
+    market.login()
+    return market
+
+
 # Создаем инстанс сервиса
-kmarket = KonturMarket()
-kmarket.login()
+# Логин в сервисе выполняется при первом обращении к kmarket, а не при импорте модуля
+kmarket = registry.register(KONTURMARKET, _connect_konturmarket)
+# Асинхронный вариант kmarket, методы вызываются через await
+kmarket_async = AsyncClient(kmarket)
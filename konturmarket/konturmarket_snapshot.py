@@ -0,0 +1,166 @@
+"""В модуле описан локальный снимок справочника ЕГАИС наименований Контур.Маркет (Rests/List). Справочник
+запрашивается с условными заголовками, а ответ сравнивается со снимком по хэшу, поэтому неизменившийся справочник
+не разбирается заново. Изменения справочника отдаются потребителям (заданиям) как разница кодов алкогольной
+продукции с момента, который потребитель отметил обработанным."""
+import hashlib
+import json
+import threading
+from dataclasses import dataclass, field
+from typing import Any, Dict, List
+
+import utils.file_cache as file_cache
+
+# Файл снимка справочника
+ASSORTMENT_SNAPSHOT_FILE = 'konturmarket_assortment.json'
+
+
+def get_entry_hash(product_info: Dict[str, Any]) -> str:
+    """Функция возвращает хэш описания товара (productInfo), по нему определяется, изменился ли товар."""
+    return hashlib.sha1(json.dumps(product_info, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+@dataclass
+class AssortmentDiff:
+    """Класс описывает изменения справочника для потребителя: коды алкогольной продукции (alco_code)."""
+
+    consumer: str  # имя потребителя
+    added: List[str] = field(default_factory=list)  # новые товары
+    removed: List[str] = field(default_factory=list)  # товары, которых больше нет в справочнике
+    changed: List[str] = field(default_factory=list)  # товары, описание которых изменилось
+    # Хэши товаров справочника, с которого посчитаны изменения, по коду. Сохраняются в commit
+    entries: Dict[str, str] = field(default_factory=dict, repr=False)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+@dataclass
+class AssortmentSnapshot:
+    """Класс описывает снимок справочника в памяти и на диске."""
+
+    # Значения заголовков ETag и Last-Modified ответа, с которого сделан снимок
+    _etag: str = field(default='', init=False)
+    _last_modified: str = field(default='', init=False)
+    # Хэш ответа, с которого сделан снимок
+    _content_hash: str = field(default='', init=False)
+    # Описания товаров (productInfo) в порядке справочника
+    _products: List[Dict[str, Any]] = field(default_factory=list, init=False, repr=False)
+    # Хэши описаний товаров по коду алкогольной продукции, см. get_entry_hash
+    _entries: Dict[str, str] = field(default_factory=dict, init=False, repr=False)
+    # Хэши товаров, которые потребитель отметил обработанными, по имени потребителя
+    _checkpoints: Dict[str, Dict[str, str]] = field(default_factory=dict, init=False, repr=False)
+    _loaded: bool = field(default=False, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    @property
+    def content_hash(self) -> str:
+        """Хэш ответа, с которого сделан снимок. Пустая строка, если снимка еще нет."""
+        with self._lock:
+            self._load()
+            return self._content_hash
+
+    @property
+    def products(self) -> List[Dict[str, Any]]:
+        """Описания товаров (productInfo) в порядке справочника."""
+        with self._lock:
+            self._load()
+            return self._products
+
+    def get_headers(self) -> Dict[str, str]:
+        """Метод возвращает заголовки условного запроса справочника. Если справочник не изменился с момента снимка,
+        сервис может ответить 304 без тела."""
+        with self._lock:
+            self._load()
+            if not self._products:
+                return {}
+            headers = {}
+            if self._etag:
+                headers['If-None-Match'] = self._etag
+            if self._last_modified:
+                headers['If-Modified-Since'] = self._last_modified
+            return headers
+
+    def update(self, content: bytes, etag: str = '', last_modified: str = '') -> bool:
+        """Метод обновляет снимок по ответу сервиса. Ответ разбирается, только если его хэш отличается от хэша
+        снимка.
+
+        :param content: Тело ответа Rests/List.
+        :param etag: Значение заголовка ETag ответа.
+        :param last_modified: Значение заголовка Last-Modified ответа.
+        :return: True, если снимок актуален. False, если в ответе нет списка товаров, снимок не меняется.
+        """
+        content_hash = hashlib.sha1(content).hexdigest()
+        with self._lock:
+            self._load()
+            if content_hash == self._content_hash and self._products:
+                # Справочник не изменился, снимок перезаписывается, только если изменились заголовки
+                if (etag, last_modified) != (self._etag, self._last_modified):
+                    self._etag, self._last_modified = etag, last_modified
+                    self._save()
+                return True
+            try:
+                goods = json.loads(content).get('list')
+            except (ValueError, AttributeError):
+                goods = None
+            if not goods:
+                return False
+            self._products = [good['productInfo'] for good in goods]
+            self._entries = {
+                str(product_info.get('egaisCode')): get_entry_hash(product_info)
+                for product_info in self._products
+            }
+            self._content_hash = content_hash
+            self._etag = etag
+            self._last_modified = last_modified
+            self._save()
+            return True
+
+    def get_diff(self, consumer: str) -> AssortmentDiff:
+        """Метод возвращает изменения справочника с момента, который потребитель отметил обработанным (commit).
+        Для нового потребителя все товары справочника - новые."""
+        with self._lock:
+            self._load()
+            entries = self._entries
+            checkpoint = self._checkpoints.get(consumer, {})
+            return AssortmentDiff(
+                consumer=consumer,
+                added=[code for code in entries if code not in checkpoint],
+                removed=[code for code in checkpoint if code not in entries],
+                changed=[code for code, entry_hash in entries.items()
+                         if code in checkpoint and checkpoint[code] != entry_hash],
+                entries=entries,
+            )
+
+    def commit(self, diff: AssortmentDiff) -> None:
+        """Метод отмечает изменения обработанными: следующий get_diff потребителя считается от справочника,
+        с которого посчитан diff."""
+        with self._lock:
+            self._load()
+            self._checkpoints[diff.consumer] = diff.entries
+            self._save()
+
+    def _load(self) -> None:
+        """Метод загружает снимок с диска при первом обращении. Вызывается под self._lock."""
+        if self._loaded:
+            return
+        self._loaded = True
+        cached = file_cache.read_json(ASSORTMENT_SNAPSHOT_FILE)
+        if not isinstance(cached, dict):
+            return
+        self._etag = cached.get('etag', '')
+        self._last_modified = cached.get('last_modified', '')
+        self._content_hash = cached.get('content_hash', '')
+        self._products = cached.get('products') or []
+        self._entries = cached.get('entries') or {}
+        self._checkpoints = cached.get('checkpoints') or {}
+
+    def _save(self) -> None:
+        """Метод сохраняет снимок на диск. Вызывается под self._lock."""
+        file_cache.write_json(ASSORTMENT_SNAPSHOT_FILE, {
+            'etag': self._etag,
+            'last_modified': self._last_modified,
+            'content_hash': self._content_hash,
+            'products': self._products,
+            'entries': self._entries,
+            'checkpoints': self._checkpoints,
+        })
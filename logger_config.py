@@ -53,5 +53,9 @@ LOGGING_CONF = {
            "level": "DEBUG" if DEBUG else "INFO",
             "handlers": ["file"],
         },
+        "konturmarket": {
+           "level": "DEBUG" if DEBUG else "INFO",
+            "handlers": ["file"],
+        },
     },
 }
\ No newline at end of file
@@ -0,0 +1,112 @@
+"""В модуле описан локальный кэш товаров МойСклад (entity/assortment). Позиции розничных продаж запрашиваются без
+раскрытия товара (positions.assortment), а нужные поля товара берутся из кэша по id товара."""
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Optional
+
+import utils.file_cache as file_cache
+
+# Файл кэша товаров
+ASSORTMENT_CACHE_FILE = 'moysklad_assortment.json'
+# Интервал между инкрементальными обновлениями кэша, сек.
+ASSORTMENT_REFRESH_INTERVAL = 10 * 60
+
+# Поля товара, которые нужны для отбора и агрегации позиций
+ASSORTMENT_FIELDS = ('id', 'name', 'pathName')
+# Поля дополнительного поля (аттрибута) товара
+ATTRIBUTE_FIELDS = ('id', 'name', 'value')
+
+
+def get_assortment_id(assortment: Dict[str, Any]) -> str:
+    """Функция возвращает id товара по товару из позиции продажи. Если товар не раскрыт, id берется из ссылки
+    assortment['meta']['href'] вида https://online.moysklad.ru/api/remap/1.2/entity/product/<id>."""
+    if assortment.get('id'):
+        return str(assortment['id'])
+    return assortment['meta']['href'].split('?')[0].rsplit('/', 1)[-1]
+
+
+def trim_assortment(assortment: Dict[str, Any]) -> Dict[str, Any]:
+    """Функция оставляет у товара только поля, нужные для отбора и агрегации позиций."""
+    trimmed = {key: assortment.get(key) for key in ASSORTMENT_FIELDS}
+    if assortment.get('attributes'):
+        trimmed['attributes'] = [
+            {key: attribute.get(key) for key in ATTRIBUTE_FIELDS}
+            for attribute in assortment['attributes']
+        ]
+    return trimmed
+
+
+@dataclass
+class AssortmentCache:
+    """Класс описывает кэш товаров в памяти и на диске. Кэш заполняется целиком при первом обновлении, затем
+    обновляется инкрементально, по полю updated товаров."""
+
+    # Интервал между обновлениями, сек.
+    refresh_interval: float = ASSORTMENT_REFRESH_INTERVAL
+    # Товары по id, см. trim_assortment
+    _products: Dict[str, Dict[str, Any]] = field(default_factory=dict, init=False, repr=False)
+    # Максимальное значение updated среди загруженных товаров
+    _cursor: str = field(default='', init=False)
+    # Время последнего обновления (time.time)
+    _refreshed: float = field(default=0.0, init=False)
+    _loaded: bool = field(default=False, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    @property
+    def cursor(self) -> str:
+        """Курсор инкрементального обновления. Пустая строка, если кэш еще не заполнялся."""
+        with self._lock:
+            self._load()
+            return self._cursor
+
+    def needs_refresh(self) -> bool:
+        """Метод возвращает True, если с последнего обновления прошло больше refresh_interval."""
+        with self._lock:
+            self._load()
+            return time.time() - self._refreshed >= self.refresh_interval
+
+    def get(self, assortment_id: str) -> Optional[Dict[str, Any]]:
+        """Метод возвращает товар по id. None, если товара нет в кэше."""
+        with self._lock:
+            self._load()
+            return self._products.get(assortment_id)
+
+    def update(self, assortment: Iterable[Dict[str, Any]]) -> None:
+        """Метод добавляет или обновляет товары в кэше и сохраняет кэш на диск.
+
+        :param assortment: Товары, как их отдает сервис (entity/assortment или сущность по ссылке).
+        """
+        with self._lock:
+            self._load()
+            for product in assortment:
+                self._products[product['id']] = trim_assortment(product)
+                if product.get('updated'):
+                    self._cursor = max(self._cursor, product['updated'])
+            self._refreshed = time.time()
+            file_cache.write_json(ASSORTMENT_CACHE_FILE, {
+                'products': self._products,
+                'cursor': self._cursor,
+                'refreshed': self._refreshed,
+            })
+
+    def clear(self) -> None:
+        """Метод очищает кэш в памяти и на диске. Следующее обновление загрузит все товары заново."""
+        with self._lock:
+            self._products = {}
+            self._cursor = ''
+            self._refreshed = 0.0
+            self._loaded = True
+            file_cache.remove(ASSORTMENT_CACHE_FILE)
+
+    def _load(self) -> None:
+        """Метод загружает кэш с диска при первом обращении. Вызывается под self._lock."""
+        if self._loaded:
+            return
+        self._loaded = True
+        cached = file_cache.read_json(ASSORTMENT_CACHE_FILE)
+        if not isinstance(cached, dict):
+            return
+        self._products = cached.get('products') or {}
+        self._cursor = cached.get('cursor', '')
+        self._refreshed = float(cached.get('refreshed', 0.0))
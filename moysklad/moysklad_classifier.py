@@ -0,0 +1,107 @@
+"""В модуле описано определение типа товара (GoodsType) позиции розничной продажи МойСклад. Тип зависит только
+от товара, поэтому он определяется один раз на товар и кэшируется, а доп. поля товара распознаются по id, а не по
+положению в списке attributes."""
+from enum import Enum
+from typing import Any, Callable, Dict, NamedTuple
+
+
+class GoodsType(Enum):
+    """Перечисление для определения, какой тип товаров необходимо получить.
+
+    alco - алкогольная продукция (исключая разливное пиво).
+    non_alco - не алкогольная продукция
+    snack - закуски
+    """
+
+    alco = 1
+    non_alco = 2
+    snack = 3
+
+
+# Наименования доп. полей товара в сервисе
+# Признак алкогольной продукции. True - чек-бокс установлен, False - не установлен
+ALCO_ATTRIBUTE = 'Алкогольная продукция'
+# Признак разливного пива. Возможные значения: Да, да, Нет, нет, пустая строка, поле может отсутствовать
+DRAFT_ATTRIBUTE = 'Розлив'
+
+
+class ProductFlags(NamedTuple):
+    """Класс описывает признаки товара, от которых зависит его тип."""
+
+    alco: bool  # доп. поле "Алкогольная продукция" отмечено
+    draft: bool  # доп. поле "Розлив" = Да
+    snack: bool  # товар в папке закусок
+
+
+# Условия отбора товара для каждого типа товаров
+GOODS_PREDICATES: Dict[GoodsType, Callable[[ProductFlags], bool]] = {
+    GoodsType.alco: lambda flags: flags.alco and not flags.draft,
+    GoodsType.non_alco: lambda flags: not flags.alco and not flags.snack,
+    GoodsType.snack: lambda flags: flags.snack,
+}
+
+
+class PositionClassifier:
+    """Класс определяет, относится ли позиция продажи к типу товаров. Для каждого товара признаки вычисляются один
+    раз и сразу проверяются условия всех типов (GOODS_PREDICATES), дальше проверка позиции - обращение к словарю
+    и проверка бита."""
+
+    def __init__(self, snack_folder: str = '') -> None:
+        """
+        :param snack_folder: Путь папки товаров с закусками в дереве товаров (начало pathName товара). Пустая
+            строка - закусок нет.
+        """
+        self.snack_folder = snack_folder
+        # Назначение доп. поля по его id: ALCO_ATTRIBUTE, DRAFT_ATTRIBUTE или пустая строка
+        self._attribute_roles: Dict[str, str] = {}
+        # Битовая маска типов товара (бит GoodsType.value) по ключу товара
+        self._products: Dict[str, int] = {}
+
+    def matches(self, good_type: GoodsType, sale_position: Dict[str, Any]) -> bool:
+        """Метод возвращает True, если товар позиции относится к типу good_type.
+
+        :param sale_position: Позиция продажи с раскрытым товаром (sale_position['assortment']).
+        """
+        return bool(self.get_mask(sale_position['assortment']) & (1 << good_type.value))
+
+    def get_mask(self, assortment: Dict[str, Any]) -> int:
+        """Метод возвращает битовую маску типов товара (бит GoodsType.value)."""
+        key = assortment.get('id') or assortment['name']
+        mask = self._products.get(key)
+        if mask is None:
+            flags = self.get_flags(assortment)
+            mask = 0
+            for good_type, predicate in GOODS_PREDICATES.items():
+                if predicate(flags):
+                    mask |= 1 << good_type.value
+            self._products[key] = mask
+        return mask
+
+    def get_flags(self, assortment: Dict[str, Any]) -> ProductFlags:
+        """Метод вычисляет признаки товара по его доп. полям и папке."""
+        alco = draft = False
+        # Если у товара не заполнено ни одно доп. поле, то ключа attributes нет
+        for attribute in assortment.get('attributes') or ():
+            role = self._get_role(attribute)
+            if role == ALCO_ATTRIBUTE:
+                alco = bool(attribute.get('value'))
+            elif role == DRAFT_ATTRIBUTE:
+                draft = str(attribute.get('value')).lower() == 'да'
+        path_name = assortment.get('pathName') or ''
+        snack = bool(self.snack_folder) and (path_name == self.snack_folder
+                                             or path_name.startswith(f'{self.snack_folder}/'))
+        return ProductFlags(alco, draft, snack)
+
+    def clear(self) -> None:
+        """Метод очищает кэш типов товаров. Вызывается после обновления товаров."""
+        self._products = {}
+
+    def _get_role(self, attribute: Dict[str, Any]) -> str:
+        """Метод возвращает назначение доп. поля. Наименование поля сравнивается один раз на id поля."""
+        attribute_id = attribute.get('id') or attribute.get('name', '')
+        role = self._attribute_roles.get(attribute_id)
+        if role is None:
+            name = attribute.get('name')
+            role = name if name in (ALCO_ATTRIBUTE, DRAFT_ATTRIBUTE) else ''
+            self._attribute_roles[attribute_id] = role
+        return role
@@ -0,0 +1,134 @@
+"""В модуле описан HTTP клиент, через который идут все запросы в сервис МойСклад."""
+import logging
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from moysklad.moysklad_ratelimit import RateLimiter, rate_limiter
+
+# Логгер для МойСклад
+logger = logging.getLogger('moysklad')
+
+CONNECT_TIMEOUT = 5  # таймаут установки соединения, сек.
+READ_TIMEOUT = 60  # таймаут ожидания ответа, сек.
+POOL_SIZE = 10  # количество соединений в пуле, не меньше, чем потоков, в которых запрашиваются страницы
+MAX_RETRIES = 4  # количество повторов запроса после первой неудачной попытки
+BACKOFF_BASE = 0.5  # базовая задержка между повторами, сек.
+BACKOFF_MAX = 30  # максимальная задержка между повторами, сек.
+# Коды ответов, при которых запрос повторяется
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+@dataclass
+class MoySkladClient:
+    """Класс описывает HTTP клиент сервиса МойСклад. Клиент держит пул keep-alive соединений (requests.Session),
+    ограничивает время ожидания каждого запроса и повторяет запрос с экспоненциальной задержкой со случайной
+    составляющей, если сервис ответил 429/5xx или соединение оборвалось. Каждый запрос проходит через общий для
+    процесса ограничитель частоты запросов."""
+
+    # Размер пула соединений
+    pool_size: int = POOL_SIZE
+    # Таймауты запроса (соединение, чтение)
+    timeout: Tuple[float, float] = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    # Количество повторов
+    max_retries: int = MAX_RETRIES
+    # Базовая и максимальная задержка между повторами
+    backoff_base: float = BACKOFF_BASE
+    backoff_max: float = BACKOFF_MAX
+    # Ограничитель частоты запросов, по умолчанию общий для всего процесса
+    rate_limiter: RateLimiter = field(default_factory=lambda: rate_limiter, repr=False)
+    # Функция получения нового токена при ответе 401. Принимает устаревший токен, возвращает новый
+    on_unauthorized: Optional[Callable[[str], str]] = field(default=None, repr=False)
+    session: requests.Session = field(init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        # МойСклад отдает сжатый ответ только при явном заголовке
+        self.session.headers.update({'Accept-Encoding': 'gzip'})
+
+    def get(self,
+            url: str,
+            params: Optional[Dict[str, Any]] = None,
+            headers: Optional[Dict[str, Any]] = None,
+            ) -> requests.Response:
+        """Метод отправляет GET запрос в сервис."""
+        return self.request('GET', url, params=params, headers=headers)
+
+    def post(self,
+             url: str,
+             params: Optional[Dict[str, Any]] = None,
+             headers: Optional[Dict[str, Any]] = None,
+             ) -> requests.Response:
+        """Метод отправляет POST запрос в сервис."""
+        return self.request('POST', url, params=params, headers=headers)
+
+    def request(self,
+                method: str,
+                url: str,
+                params: Optional[Dict[str, Any]] = None,
+                headers: Optional[Dict[str, Any]] = None,
+                ) -> requests.Response:
+        """Метод отправляет запрос в сервис, повторяя его при временных ошибках.
+
+        :param method: HTTP метод.
+        :param url: Url запроса.
+        :param params: Параметры запроса.
+        :param headers: Заголовки запроса.
+        :return: Ответ сервиса. Если все попытки закончились ответом 429/5xx, возвращается последний ответ.
+            На ответ 401 запрос с токеном повторяется один раз, с токеном от on_unauthorized.
+        :raises requests.RequestException: Если все попытки закончились ошибкой соединения или таймаутом.
+        """
+        attempt = 0
+        token_refreshed = False
+        while True:
+            try:
+                with self.rate_limiter:
+                    response = self.session.request(method, url, params=params, headers=headers,
+                                                    timeout=self.timeout)
+                self.rate_limiter.update(response.headers)
+            except (requests.ConnectionError, requests.Timeout) as error:
+                if attempt >= self.max_retries:
+                    raise
+                logger.warning(f'Ошибка запроса {method} {url}, попытка {attempt + 1}: {error}')
+            else:
+                if response.status_code == 401 and not token_refreshed:
+                    token = self._refresh_token(headers)
+                    if token:
+                        token_refreshed = True
+                        headers = dict(headers or {}, Authorization=f'Bearer {token}')
+                        continue
+                if response.status_code not in RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                logger.warning(f'Сервис MoySklad ответил {response.status_code} на {method} {url}, '
+                               f'попытка {attempt + 1}')
+                # Если сервис сообщил, когда можно повторить запрос, ожидание выдержит ограничитель запросов
+                if response.status_code == 429 and 'X-Lognex-Retry-After' in response.headers:
+                    attempt += 1
+                    continue
+            time.sleep(self._get_backoff(attempt))
+            attempt += 1
+
+    def _refresh_token(self, headers: Optional[Dict[str, Any]]) -> str:
+        """Метод возвращает новый токен для повтора запроса после ответа 401. Если запрос был без токена
+        (например, запрос самого токена) или функция получения токена не задана, возвращается пустая строка."""
+        authorization = str((headers or {}).get('Authorization', ''))
+        if self.on_unauthorized is None or not authorization.startswith('Bearer '):
+            return ''
+        token = self.on_unauthorized(authorization[len('Bearer '):])
+        # Если токен не изменился, повторять запрос бессмысленно
+        return token if token and f'Bearer {token}' != authorization else ''
+
+    def _get_backoff(self, attempt: int) -> float:
+        """Метод возвращает задержку перед повтором запроса. Используется экспоненциальная задержка с полным
+        случайным разбросом (full jitter), чтобы параллельные потоки не повторяли запросы одновременно.
+
+        :param attempt: Номер неудачной попытки, начиная с 0.
+        """
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
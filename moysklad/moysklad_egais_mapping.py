@@ -0,0 +1,113 @@
+"""В модуле описан кэш таблицы соответствий коммерческое наименование - наименование ЕГАИС (лист
+"Соответсвия ЕГАИС" в GoogleSheets)."""
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List
+
+import googledrive.googlesheets_vars as gs_vars
+import utils.file_cache as file_cache
+import utils.names as names
+from googledrive.googledrive_class_lib import EGAIS_MAPPING_RANGE, googlesheets
+
+# Логгер для МойСклад
+logger = logging.getLogger('moysklad')
+
+# Файл кэша таблицы соответствий
+EGAIS_MAPPING_CACHE_FILE = 'egais_mapping.json'
+# Время, в течение которого таблица соответствий считается актуальной без проверки, сек.
+EGAIS_MAPPING_TTL = 10 * 60
+
+
+def build_lookup(comp_table: List[List[str]]) -> Dict[str, str]:
+    """Функция строит словарь для поиска ЕГАИС наименования по коммерческому наименованию.
+
+    :param comp_table: Таблица соответствий коммерческое наименование - наименование ЕГАИС.
+    :type comp_table: Список списков. Элемент вложенного списка: [0] - коммерческое наименование, [1] - ЕГАИС
+    наименование.
+    :return: Словарь. Ключ - коммерческое наименование в нижнем регистре, значение - ЕГАИС наименование.
+    """
+    # Т.к. мы не можем гарантировать, что вложенные списки в comp_table - списки из 2ух элементов,
+    # то необходимо проверять их длину
+    # Коммерческое наименование приводить нужно к нижнему регистру, т.к. в сервисе товар может храниться как
+    # Aircraft - Рождественский Эль, а в таблице ЕГАИС как Aircraft - Рождественский эль, см. names.get_name_key
+    return {
+        names.get_name_key(str(good[0])): good[1]
+        for good in comp_table if len(good) > 1
+    }
+
+
+@dataclass
+class EgaisMapping:
+    """Класс описывает кэш таблицы соответствий в памяти и на диске. Таблица перечитывается из GoogleSheets, только
+    если истек ttl и при этом изменилось время изменения таблицы (modifiedTime в Google Drive)."""
+
+    # Время актуальности кэша без проверки, сек.
+    ttl: float = EGAIS_MAPPING_TTL
+    # Словарь соответствий, см. build_lookup
+    _lookup: Dict[str, str] = field(default_factory=dict, init=False, repr=False)
+    # Время изменения таблицы, с которого построен словарь
+    _modified_time: str = field(default='', init=False)
+    # Время последней проверки актуальности (time.time)
+    _checked: float = field(default=0.0, init=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    @property
+    def modified_time(self) -> str:
+        """Время изменения таблицы, с которого построен словарь соответствий. Пустая строка, если неизвестно."""
+        with self._lock:
+            return self._modified_time
+
+    def get(self) -> Dict[str, str]:
+        """Метод возвращает словарь соответствий, при необходимости перечитывая таблицу из GoogleSheets. Если
+        таблицу прочитать не удалось, возвращается прежний словарь (из памяти или с диска), а время изменения
+        не сдвигается, поэтому следующий вызов снова прочитает таблицу.
+
+        :return: Словарь соответствий. Пустой словарь, если таблицу получить не удалось и прежнего словаря нет.
+        """
+        with self._lock:
+            if not self._lookup:
+                self._load()
+            if self._lookup and time.time() - self._checked < self.ttl:
+                return self._lookup
+
+            modified_time = googlesheets.get_modified_time(gs_vars.SPREEDSHEET_ID_EGAIS)
+            if not (self._lookup and modified_time and modified_time == self._modified_time):
+                logger.debug('Получаем таблицу соответствий ЕГАИС из GoogleSheets')
+                comp_table = googlesheets.get_many([EGAIS_MAPPING_RANGE])[0]
+                if not comp_table:
+                    logger.error('Не удалось получить таблицу соответствий ЕГАИС, используем прежнюю')
+                    return self._lookup
+                self._lookup = build_lookup(comp_table)
+                self._modified_time = modified_time
+            self._checked = time.time()
+            self._save()
+            return self._lookup
+
+    def invalidate(self) -> None:
+        """Метод сбрасывает кэш в памяти и на диске. Следующий вызов get перечитает таблицу из GoogleSheets."""
+        with self._lock:
+            self._lookup = {}
+            self._modified_time = ''
+            self._checked = 0.0
+            file_cache.remove(EGAIS_MAPPING_CACHE_FILE)
+
+    def _load(self) -> None:
+        """Метод загружает кэш с диска."""
+        cached = file_cache.read_json(EGAIS_MAPPING_CACHE_FILE)
+        if not isinstance(cached, dict):
+            return
+        self._lookup = cached.get('lookup') or {}
+        self._modified_time = cached.get('modified_time', '')
+        self._checked = float(cached.get('checked', 0.0))
+
+    def _save(self) -> None:
+        """Метод сохраняет кэш на диск."""
+        if not self._lookup:
+            return
+        file_cache.write_json(EGAIS_MAPPING_CACHE_FILE, {
+            'lookup': self._lookup,
+            'modified_time': self._modified_time,
+            'checked': self._checked,
+        })
@@ -0,0 +1,135 @@
+"""В модуле описан ограничитель частоты запросов в сервис МойСклад.
+Ограничения сервиса https://dev.moysklad.ru/doc/api/remap/1.2/#mojsklad-json-api-obschie-swedeniq-ogranicheniq
+"""
+import asyncio
+import threading
+import time
+from dataclasses import dataclass, field
+from types import TracebackType
+from typing import Mapping, Optional, Type
+
+RATE_LIMIT = 45  # количество запросов, разрешенных за период RATE_PERIOD
+RATE_PERIOD = 3.0  # период, сек.
+MAX_PARALLEL = 5  # количество одновременных запросов от одного пользователя
+PARALLEL_POLL = 0.05  # интервал проверки свободного слота для корутин, сек.
+
+
+@dataclass
+class RateLimiter:
+    """Класс описывает ограничитель запросов: "корзина токенов" на RATE_LIMIT запросов за RATE_PERIOD секунд и
+    ограничение на количество одновременных запросов. Лимиты подстраиваются под заголовки ответов сервиса
+    X-RateLimit-Limit, X-Lognex-Retry-TimeInterval, X-RateLimit-Remaining и X-Lognex-Retry-After.
+
+    Один инстанс используется во всех потоках (with limiter) и корутинах (async with limiter) процесса.
+    """
+
+    rate_limit: int = RATE_LIMIT
+    period: float = RATE_PERIOD
+    max_parallel: int = MAX_PARALLEL
+    _tokens: float = field(init=False, repr=False)
+    _updated: float = field(init=False, repr=False)
+    # До этого момента (time.monotonic) запросы не отправляются, выставляется по X-Lognex-Retry-After
+    _blocked_until: float = field(default=0.0, init=False, repr=False)
+    # Количество выполняющихся запросов
+    _active: int = field(default=0, init=False, repr=False)
+    _condition: threading.Condition = field(default_factory=threading.Condition, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        self._tokens = float(self.rate_limit)
+        self._updated = time.monotonic()
+
+    def __enter__(self) -> 'RateLimiter':
+        self.acquire()
+        return self
+
+    def __exit__(self,
+                 exc_type: Optional[Type[BaseException]],
+                 exc_val: Optional[BaseException],
+                 exc_tb: Optional[TracebackType],
+                 ) -> None:
+        self.release()
+
+    async def __aenter__(self) -> 'RateLimiter':
+        await self.acquire_async()
+        return self
+
+    async def __aexit__(self,
+                        exc_type: Optional[Type[BaseException]],
+                        exc_val: Optional[BaseException],
+                        exc_tb: Optional[TracebackType],
+                        ) -> None:
+        self.release()
+
+    def acquire(self) -> None:
+        """Метод блокирует поток, пока не будет разрешено отправить запрос."""
+        with self._condition:
+            delay = self._try_acquire()
+            while delay:
+                # Ожидание прерывается раньше, если другой поток освободил слот
+                self._condition.wait(delay)
+                delay = self._try_acquire()
+
+    async def acquire_async(self) -> None:
+        """Метод приостанавливает корутину, пока не будет разрешено отправить запрос."""
+        with self._condition:
+            delay = self._try_acquire()
+        while delay:
+            await asyncio.sleep(delay)
+            with self._condition:
+                delay = self._try_acquire()
+
+    def release(self) -> None:
+        """Метод освобождает слот одновременного запроса."""
+        with self._condition:
+            self._active -= 1
+            self._condition.notify()
+
+    def update(self, headers: Mapping[str, str]) -> None:
+        """Метод подстраивает лимиты под заголовки ответа сервиса.
+
+        :param headers: Заголовки ответа сервиса МойСклад.
+        """
+        limit = headers.get('X-RateLimit-Limit')
+        interval = headers.get('X-Lognex-Retry-TimeInterval')
+        remaining = headers.get('X-RateLimit-Remaining')
+        retry_after = headers.get('X-Lognex-Retry-After')
+        with self._condition:
+            now = time.monotonic()
+            self._refill(now)
+            if limit and interval:
+                self.rate_limit = int(limit)
+                self.period = int(interval) / 1000
+            # Сервис точнее знает, сколько запросов осталось
+            if remaining is not None:
+                self._tokens = min(self._tokens, float(remaining))
+            # Сервис отказал (429) и сообщил, через сколько миллисекунд можно повторить
+            if retry_after:
+                self._tokens = 0.0
+                self._blocked_until = max(self._blocked_until, now + int(retry_after) / 1000)
+
+    def _refill(self, now: float) -> None:
+        """Метод пополняет корзину токенов за время, прошедшее с прошлого пополнения."""
+        self._tokens = min(float(self.rate_limit),
+                           self._tokens + (now - self._updated) * self.rate_limit / self.period)
+        self._updated = now
+
+    def _try_acquire(self) -> float:
+        """Метод пытается занять слот запроса. Вызывается под self._condition.
+
+        :return: 0, если слот занят, иначе время в секундах, через которое стоит попробовать снова.
+        """
+        now = time.monotonic()
+        self._refill(now)
+        if now < self._blocked_until:
+            return self._blocked_until - now
+        if self._active >= self.max_parallel:
+            return PARALLEL_POLL
+        if self._tokens < 1:
+            return (1 - self._tokens) * self.period / self.rate_limit
+        self._tokens -= 1
+        self._active += 1
+        return 0.0
+
+
+# Общий для всего процесса ограничитель запросов в МойСклад
+rate_limiter = RateLimiter()
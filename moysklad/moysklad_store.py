@@ -0,0 +1,201 @@
+"""В модуле описано локальное хранилище (SQLite) розничных продаж МойСклад. Хранилище обновляется инкрементально,
+по полю updated документов, поэтому отчет за любой уже загруженный период строится без запроса всех продаж
+из сервиса."""
+import sqlite3
+import threading
+from contextlib import closing
+from dataclasses import dataclass, field
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import utils.file_cache as file_cache
+from moysklad.moysklad_assortment import get_assortment_id
+
+# Файл базы данных в папке кэша
+STORE_FILE = 'moysklad_sales.sqlite3'
+# Версия схемы. Если версия базы на диске другая, данные удаляются и загружаются из сервиса заново.
+# 3 - в хранилище загружаются продажи всех товаров, а не только из папки "Пиво"
+SCHEMA_VERSION = 3
+
+DROP_SCHEMA = '''
+DROP TABLE IF EXISTS position;
+DROP TABLE IF EXISTS retail_demand;
+DROP TABLE IF EXISTS sync_state;
+'''
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS retail_demand (
+    id TEXT PRIMARY KEY,
+    moment TEXT NOT NULL,
+    updated TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS retail_demand_moment ON retail_demand (moment);
+CREATE TABLE IF NOT EXISTS position (
+    demand_id TEXT NOT NULL REFERENCES retail_demand (id) ON DELETE CASCADE,
+    num INTEGER NOT NULL,
+    quantity REAL NOT NULL,
+    price REAL NOT NULL,
+    assortment_id TEXT NOT NULL,
+    PRIMARY KEY (demand_id, num)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+# Ключи sync_state
+# Начало периода (moment), с которого продажи загружены в хранилище
+SYNCED_FROM = 'synced_from'
+# Максимальное значение updated среди загруженных документов
+CURSOR = 'cursor'
+
+
+@dataclass
+class RetailDemandStore:
+    """Класс описывает хранилище розничных продаж. Документ хранится с полями id, moment, updated, позиции - с
+    количеством, ценой и id товара. Из хранилища документы отдаются в том же виде, в каком их отдает сервис
+    (retail_demand['positions']['rows'], товар не раскрыт), поэтому агрегация не зависит от источника данных.
+
+    Удаленные в сервисе документы инкрементальное обновление не видит. Они удаляются из хранилища при повторной
+    загрузке периода (load_period) или при сверке id документов периода с сервисом (remove_missing).
+    """
+
+    # Путь к файлу базы данных
+    path: str = field(default_factory=lambda: file_cache.get_cache_path(STORE_FILE))
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def __post_init__(self) -> None:
+        with closing(self._connect()) as connection, connection:
+            if connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                connection.executescript(DROP_SCHEMA)
+            connection.executescript(SCHEMA)
+            connection.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+
+    def get_state(self, key: str) -> str:
+        """Метод возвращает значение из sync_state. Пустая строка, если значения нет."""
+        with closing(self._connect()) as connection:
+            return self._get_state(connection, key)
+
+    def save(self, retail_demands: Iterable[Dict[str, Any]]) -> str:
+        """Метод добавляет или обновляет документы в хранилище и сдвигает курсор.
+
+        :param retail_demands: Документы retaildemand, как их отдает сервис, с раскрытыми positions.
+        :return: Новое значение курсора (максимальный updated).
+        """
+        with self._lock, closing(self._connect()) as connection, connection:
+            cursor = self._get_state(connection, CURSOR)
+            for retail_demand in retail_demands:
+                self._save_one(connection, retail_demand)
+                cursor = max(cursor, retail_demand['updated'])
+            self._set_state(connection, CURSOR, cursor)
+        return cursor
+
+    def load_period(self, retail_demands: Iterable[Dict[str, Any]], moment_from: str, moment_to: str) -> None:
+        """Метод заменяет в хранилище все документы периода [moment_from, moment_to] переданными документами и
+        расширяет загруженный период до moment_from.
+
+        :param retail_demands: Все документы периода, как их отдает сервис.
+        :param moment_from: Начало периода, YYYY-MM-DD HH:MM:SS.
+        :param moment_to: Конец периода, YYYY-MM-DD HH:MM:SS.
+        """
+        with self._lock, closing(self._connect()) as connection, connection:
+            connection.execute('DELETE FROM retail_demand WHERE moment >= ? AND moment <= ?',
+                               (moment_from, moment_to))
+            cursor = self._get_state(connection, CURSOR)
+            for retail_demand in retail_demands:
+                self._save_one(connection, retail_demand)
+                cursor = max(cursor, retail_demand['updated'])
+            self._set_state(connection, CURSOR, cursor)
+            synced_from = self._get_state(connection, SYNCED_FROM)
+            if not synced_from or moment_from < synced_from:
+                self._set_state(connection, SYNCED_FROM, moment_from)
+
+    def remove_missing(self, demand_ids: Iterable[str], moment_from: str, moment_to: str) -> int:
+        """Метод удаляет документы периода [moment_from, moment_to], которых нет среди demand_ids.
+
+        :param demand_ids: id всех документов периода в сервисе.
+        :param moment_from: Начало периода, YYYY-MM-DD HH:MM:SS.
+        :param moment_to: Конец периода, YYYY-MM-DD HH:MM:SS.
+        :return: Количество удаленных документов.
+        """
+        existing = set(demand_ids)
+        with self._lock, closing(self._connect()) as connection, connection:
+            missing = [
+                (demand_id,)
+                for demand_id, in connection.execute(
+                    'SELECT id FROM retail_demand WHERE moment >= ? AND moment <= ?', (moment_from, moment_to))
+                if demand_id not in existing
+            ]
+            connection.executemany('DELETE FROM retail_demand WHERE id = ?', missing)
+        return len(missing)
+
+    def get_retail_demands(self, moment_from: str, moment_to: str) -> Iterator[Dict[str, Any]]:
+        """Метод по одному возвращает документы периода [moment_from, moment_to] в формате ответа сервиса.
+        Строки читаются из базы курсором, поэтому в памяти находится только текущий документ.
+
+        :param moment_from: Начало периода, YYYY-MM-DD HH:MM:SS.
+        :param moment_to: Конец периода, YYYY-MM-DD HH:MM:SS.
+        """
+        with closing(self._connect()) as connection:
+            rows = connection.execute(
+                'SELECT d.id, p.quantity, p.price, p.assortment_id '
+                'FROM retail_demand d JOIN position p ON p.demand_id = d.id '
+                'WHERE d.moment >= ? AND d.moment <= ? '
+                'ORDER BY d.moment, d.id, p.num',
+                (moment_from, moment_to),
+            )
+            for demand_id, positions in groupby(rows, key=itemgetter(0)):
+                yield {
+                    'id': demand_id,
+                    'positions': {'rows': [
+                        {'quantity': quantity, 'price': price, 'assortment': {'id': assortment_id}}
+                        for _, quantity, price, assortment_id in positions
+                    ]},
+                }
+
+    def clear(self) -> None:
+        """Метод удаляет все данные из хранилища. Следующий запрос загрузит период из сервиса заново."""
+        with self._lock, closing(self._connect()) as connection, connection:
+            connection.execute('DELETE FROM retail_demand')
+            connection.execute('DELETE FROM sync_state')
+
+    def _connect(self) -> sqlite3.Connection:
+        """Метод открывает соединение с базой данных. Соединение открывается на каждую операцию, т.к. хранилище
+        используется из разных потоков."""
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA foreign_keys=ON')
+        return connection
+
+    @staticmethod
+    def _save_one(connection: sqlite3.Connection, retail_demand: Dict[str, Any]) -> None:
+        """Метод сохраняет документ с позициями, заменяя сохраненный ранее."""
+        demand_id = retail_demand['id']
+        connection.execute('DELETE FROM retail_demand WHERE id = ?', (demand_id,))
+        connection.execute('INSERT INTO retail_demand (id, moment, updated) VALUES (?, ?, ?)',
+                           (demand_id, retail_demand['moment'], retail_demand['updated']))
+        connection.executemany(
+            'INSERT INTO position (demand_id, num, quantity, price, assortment_id) VALUES (?, ?, ?, ?, ?)',
+            (
+                (
+                    demand_id,
+                    num,
+                    sale_position['quantity'],
+                    sale_position['price'],
+                    get_assortment_id(sale_position['assortment']),
+                )
+                for num, sale_position in enumerate(retail_demand['positions']['rows'])
+            ),
+        )
+
+    @staticmethod
+    def _get_state(connection: sqlite3.Connection, key: str) -> str:
+        row = connection.execute('SELECT value FROM sync_state WHERE key = ?', (key,)).fetchone()
+        return row[0] if row else ''
+
+    @staticmethod
+    def _set_state(connection: sqlite3.Connection, key: str, value: Optional[str]) -> None:
+        if value:
+            connection.execute('INSERT OR REPLACE INTO sync_state (key, value) VALUES (?, ?)', (key, value))
@@ -3,7 +3,7 @@
 import base64
 from datetime import datetime
 from enum import Enum
-from typing import Dict, Any, NamedTuple
+from typing import Dict, Any, NamedTuple, Tuple
 from urllib.parse import urljoin
 
 import privatedata.moysklad_privatedata as ms_pvdata
@@ -15,16 +15,35 @@ GEO_ORG_HREF = JSON_URL + 'entity/organization/' + GEO_ORG_ID  # Ссылка н
 GEO_SHOP_ID = '5057e2b5-b498-11e7-7a34-5acf0002684b'  # d розничной точки "География"
 GEO_SHOP_HREF = JSON_URL + 'entity/retailstore/' + GEO_SHOP_ID
 
+PAGE_LIMIT = 100  # максимальное количество элементов на странице ответа при expand
+ASSORTMENT_PAGE_LIMIT = 1000  # максимальное количество элементов на странице ответа без expand и отчетов
+PAGE_WORKERS = 4  # количество потоков для параллельного получения страниц
+# Фильтр товаров по признаку архивности. По умолчанию entity/assortment не отдает архивные товары, а продажи
+# товаров, которые потом отправили в архив, должны попадать в отчеты
+ASSORTMENT_ARCHIVED_FILTERS = ('archived=true', 'archived=false')
+
 
 class UrlType(Enum):
     """Перечисление для определения, какой тип url необходимо сформировать.
 
     token - для получения токена.
     retail_demand - для получения розничных продаж
+    retail_demand_updated - для получения розничных продаж, измененных начиная с определенного момента
+    assortment - для получения всех товаров
+    assortment_updated - для получения товаров, измененных начиная с определенного момента
+    profit_by_product - для получения отчета о прибыльности по товарам (продажи, агрегированные сервисом)
+    product_folder - для получения всех папок товаров
+    retail_demand_ids - для получения розничных продаж за период без позиций, для сверки id с хранилищем
     """
 
     token = 1
     retail_demand = 2
+    retail_demand_updated = 3
+    assortment = 4
+    assortment_updated = 5
+    profit_by_product = 6
+    product_folder = 7
+    retail_demand_ids = 8
 
 
 class Url(NamedTuple):
@@ -45,7 +64,6 @@ def get_headers(token: str = '') -> Dict[str, Any]:
     if token:
         headers = {
             'Content-Type': 'application/json',
-            'Lognex-Pretty-Print-JSON': 'true',
             'Authorization': 'Bearer ' + token}
     else:
         pvd = f'{ms_pvdata.USER}:{ms_pvdata.PASSWORD}'.encode()
@@ -53,15 +71,34 @@ def get_headers(token: str = '') -> Dict[str, Any]:
     return headers
 
 
-def get_url(_type: UrlType, start_period: datetime = datetime.today(), end_period: datetime = None) -> Url:
+def get_period_bounds(start_period: datetime, end_period: datetime) -> Tuple[str, str]:
+    """Функция возвращает границы периода продаж в формате поля moment документа YYYY-MM-DD HH:MM:SS.
+
+    :param start_period: начало периода продаж, start_period 00:00:00
+    :param end_period: конец периода продаж, end_period 23:59:00
+    """
+    return start_period.strftime('%Y-%m-%d 00:00:00'), end_period.strftime('%Y-%m-%d 23:59:00')
+
+
+def get_url(_type: UrlType,
+            start_period: datetime = datetime.today(),
+            end_period: datetime = None,
+            folder_id: str = '',
+            ) -> Url:
     """Функция для получения url.
 
     :param _type: UrlType.token - url для получения токена, UrlType.retail_demand - url для получения розничны
-    продаж за определённый период
-    :param start_period: начало периода продаж
+    продаж за определённый период, UrlType.retail_demand_updated - url для получения розничных продаж, измененных
+    начиная с start_period, UrlType.assortment - url для получения всех товаров, UrlType.assortment_updated - url
+    для получения товаров, измененных начиная с start_period, UrlType.profit_by_product - url для получения
+    продаж точки "География" за период, агрегированных по товарам, UrlType.retail_demand_ids - url для получения
+    розничных продаж за период без позиций
+    :param start_period: начало периода продаж (для UrlType.*_updated - момент изменения)
     :type start_period: datetime.datetime
     :param end_period: конец периода продаж. Если не указан, считается как start_period 23:59
     :type start_period: datetime.datetime
+    :param folder_id: id папки товаров. Если указан, сервис отдает только продажи, в которых есть товары из папки
+        (для UrlType.profit_by_product - только товары из папки)
 
     :returns: Возвращается объект Url
     :rtypes: Url
@@ -72,28 +109,77 @@ def get_url(_type: UrlType, start_period: datetime = datetime.today(), end_perio
         url = Url(urljoin(JSON_URL, 'security/token'), {})
 
     # если нужен url для запроса продаж
-    elif _type == UrlType.retail_demand:
-        # если конец периода не указан входным параметром, считаем, что запросили продажи за вчера
-        if end_period is None:
-            end_period = start_period
-
-        # формат даты документа YYYY-MM-DD HH:MM:SS
-        date_filter_from = f'moment>{start_period.strftime("%Y-%m-%d 00:00:00")}'
-        date_filter_to = f'moment<{end_period.strftime("%Y-%m-%d 23:59:00")}'
-
-        # Т.к. в запрашиваемом периоде может оказаться продаж больше, чем 100, а МойСклад отдает только страницами
-        # по 100 продаж за ответ, чтобы получить следующую страницу, нежно формировать новый запрос со смещением
-        # offset=200, следующий offset-300 и т.д. В данной реализации это не учтено, т.к. больше 100 продаж не выявлено
+    elif _type in (UrlType.retail_demand, UrlType.retail_demand_updated, UrlType.retail_demand_ids):
+        if _type == UrlType.retail_demand_ids:
+            if end_period is None:
+                end_period = start_period
+            # Границы периода включаются, как при выборке периода из хранилища продаж
+            moment_from, moment_to = get_period_bounds(start_period, end_period)
+            date_filters = [f'moment>={moment_from}', f'moment<={moment_to}']
+        elif _type == UrlType.retail_demand:
+            # если конец периода не указан входным параметром, считаем, что запросили продажи за вчера
+            if end_period is None:
+                end_period = start_period
+
+            # формат даты документа YYYY-MM-DD HH:MM:SS
+            moment_from, moment_to = get_period_bounds(start_period, end_period)
+            date_filters = [f'moment>{moment_from}', f'moment<{moment_to}']
+        else:
+            # продажи, измененные начиная с момента start_period
+            date_filters = [f'updated>={start_period.strftime("%Y-%m-%d %H:%M:%S")}']
+
+        filters = [f'organization={JSON_URL}entity/organization/{GEO_ORG_ID}']
+        if folder_id:
+            # только продажи, в которых есть товары из папки folder_id
+            filters.append(f'assortment={JSON_URL}entity/productfolder/{folder_id}')
+
+        # МойСклад отдает продажи страницами по PAGE_LIMIT штук за ответ. Остальные страницы запрашиваются
+        # со смещением offset=100, offset=200 и т.д. (см. MoySklad._get_rows)
         request_filter: dict[str, Any] = {
-            'filter': [
-                f'organization={JSON_URL}entity/organization/{GEO_ORG_ID}',
-                f'assortment={JSON_URL}entity/productfolder/{BEER_FOLDER_ID}',
-                date_filter_from,
-                date_filter_to],
+            'filter': [*filters, *date_filters],
             'offset': '0',
-            'expand': 'positions,positions.assortment',
-            'limit': '100'}
+            # Товары позиций не раскрываются, они берутся из локального кэша товаров (см. AssortmentCache)
+            'expand': 'positions',
+            'limit': str(PAGE_LIMIT)}
+        if _type == UrlType.retail_demand_ids:
+            # Для сверки нужны только id документов, позиции не раскрываются, поэтому страница больше
+            del request_filter['expand']
+            request_filter['limit'] = str(ASSORTMENT_PAGE_LIMIT)
         url = Url(urljoin(JSON_URL, 'entity/retaildemand'), request_filter)
+
+    # если нужен url для запроса товаров
+    elif _type in (UrlType.assortment, UrlType.assortment_updated):
+        request_filter = {
+            'filter': list(ASSORTMENT_ARCHIVED_FILTERS),
+            'offset': '0',
+            'limit': str(ASSORTMENT_PAGE_LIMIT)}
+        if _type == UrlType.assortment_updated:
+            # товары, измененные начиная с момента start_period
+            request_filter['filter'].append(f'updated>={start_period.strftime("%Y-%m-%d %H:%M:%S")}')
+        url = Url(urljoin(JSON_URL, 'entity/assortment'), request_filter)
+    # если нужен url для запроса отчета о прибыльности по товарам
+    elif _type == UrlType.profit_by_product:
+        if end_period is None:
+            end_period = start_period
+        moment_from, moment_to = get_period_bounds(start_period, end_period)
+        # В отчет попадают только розничные продажи точки "География"
+        filters = [f'organization={GEO_ORG_HREF}', f'retailStore={GEO_SHOP_HREF}']
+        if folder_id:
+            filters.append(f'productFolder={JSON_URL}entity/productfolder/{folder_id}')
+        request_filter = {
+            'momentFrom': moment_from,
+            'momentTo': moment_to,
+            'filter': filters,
+            'offset': '0',
+            'limit': str(ASSORTMENT_PAGE_LIMIT)}
+        url = Url(urljoin(JSON_URL, 'report/profit/byproduct'), request_filter)
+    # если нужен url для запроса папок товаров
+    elif _type == UrlType.product_folder:
+        request_filter = {
+            'filter': list(ASSORTMENT_ARCHIVED_FILTERS),
+            'offset': '0',
+            'limit': str(ASSORTMENT_PAGE_LIMIT)}
+        url = Url(urljoin(JSON_URL, 'entity/productfolder'), request_filter)
     else:
         url = Url('', {})
     return url
@@ -1,11 +1,18 @@
 """Модуль для запуска сервиса по расписанию."""
+import asyncio
+import logging
+
 import privatedata.tbot_privatedata as pvd_telebot
 
-import utils.service as service
+import utils.async_service as async_service
+from utils.registry import registry
 
-if __name__ == '__main__':
-    # Отправка заполненного файла с продажами за сегодня в телеграм чат
-    service.send_sales_file_to_telegram(pvd_telebot.TELEGRAM_GEO_CHAT_ID)
+logger = logging.getLogger('main_logger')
 
-    # Обновление таблицы GoogleSheets новым списком ЕГАИС наименований
-    service.update_goooglesheets_egais_assortment(pvd_telebot.TELEGRAM_GEO_CHAT_ID)
+if __name__ == '__main__':
+    # Задания выполняются одновременно, каждое подключается к нужным ему сервисам:
+    # - отправка заполненного файла с продажами за сегодня в телеграм чат
+    # - обновление таблицы GoogleSheets новым списком ЕГАИС наименований
+    results = asyncio.run(async_service.run_jobs(pvd_telebot.TELEGRAM_GEO_CHAT_ID))
+    logger.debug(f'Время подключения к сервисам: {registry.timings}')
+    logger.debug(f'Результаты заданий: {results}')
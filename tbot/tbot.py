@@ -1,13 +1,25 @@
 # пример кода для телеграм бота взят https://habr.com/ru/post/580408/
 import datetime
 import logging.config
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
 
 import telebot
 from privatedata.tbot_privatedata import TOKEN
 
+import googledrive.googlesheets_vars as gs_vars
+from googledrive.googledrive_class_lib import googlesheets
 import logger_config
-import utils.file_utils
+import moysklad.moysklad_urls as ms_urls
 from moysklad.moysklad_class_lib import ms, GoodsType
+from utils.coalesce import SingleFlight
+from utils.registry import GOOGLESHEETS, MOYSKLAD, registry
+from utils.report_cache import Report, get_report_key, report_cache
+
+# Количество отчетов, которые готовятся одновременно
+REPORT_WORKERS = 2
+# Количество файлов, которые одновременно отправляются в Telegram
+SEND_WORKERS = 4
 
 # Инициализация
 logging.config.dictConfig(logger_config.LOGGING_CONF)
@@ -15,6 +27,11 @@ logging.config.dictConfig(logger_config.LOGGING_CONF)
 logger = logging.getLogger('tbot')
 # Создаем бота
 bot = telebot.TeleBot(TOKEN, parse_mode=None)
+# Пул, в котором готовятся отчеты. Одинаковые одновременные команды готовят отчет один раз
+reports = SingleFlight(ThreadPoolExecutor(max_workers=REPORT_WORKERS, thread_name_prefix='report'))
+# Пул, в котором готовые отчеты отправляются в чаты. Отправка медленнее построения отчета из кэша, поэтому она
+# не занимает потоки пула отчетов
+senders = ThreadPoolExecutor(max_workers=SEND_WORKERS, thread_name_prefix='send')
 
 
 @bot.message_handler(commands=['egais'])
@@ -22,27 +39,107 @@ def start_message(message: telebot.types.Message) -> None:
     logger.debug('Приняли команду: ' + message.json['text'])
     bot.send_message(message.chat.id, 'Готовлю данные...')
 
-    # Получаем ссылку на файл товаров ЕГАИС, проданных за прошедший день.
-    file = ms.save_to_file_retail_demand_by_period(
+    # Файл строится в пуле отчетов, обработчик сразу освобождается для других чатов. Если файл за этот день уже
+    # строится по команде из другого чата, ждем тот же результат
+    day = datetime.date.today() - datetime.timedelta(days=1)
+    future = reports.submit(('egais', day), _build_sales_file, day)
+    chat_id = message.chat.id
+    # callback выполняется в потоке пула отчетов, поэтому только передает отправку в пул отправки
+    future.add_done_callback(
+        lambda done: senders.submit(_send_sales_file, chat_id, done).add_done_callback(_log_send_error))
+
+
+def _build_sales_file(day: datetime.date) -> Optional[Report]:
+    """Функция готовит файл товаров ЕГАИС, проданных за день. Отчет за закрытый день берется из кэша отчетов, если
+    с его построения не менялась таблица соответствий ЕГАИС.
+
+    :return: Отчет. None, если файл подготовить не удалось.
+    """
+    registry.connect(GOOGLESHEETS)
+    # Наименования ЕГАИС в отчете зависят от таблицы соответствий, версия данных - время ее изменения
+    data_version = googlesheets.get_modified_time(gs_vars.SPREEDSHEET_ID_EGAIS)
+    key = _get_report_key(day, GoodsType.alco, data_version)
+    if key:
+        report = report_cache.get(key)
+        if report is not None:
+            logger.debug(f'Отчет за {day} из кэша')
+            return report
+
+    registry.connect(MOYSKLAD)
+    # Получаем файл товаров ЕГАИС, проданных за день. Файл строится в памяти, на диск не пишется
+    sales_file = ms.get_file_retail_demand_by_period(
         good_type=GoodsType.alco,
-        start_period=datetime.datetime.today() - datetime.timedelta(days=1),
+        start_period=datetime.datetime.combine(day, datetime.time()),
         end_period=None
     )
+    if sales_file is None:
+        return None
+
+    file_name, content = sales_file
+    # Отчет кэшируется, только если наименования ЕГАИС взяты из той же версии таблицы соответствий, что в ключе.
+    # Если таблицу прочитать не удалось, наименования взяты из прежней версии или не заполнены
+    if key and ms.egais_mapping.modified_time == data_version:
+        return report_cache.put(key, file_name, content)
+    return Report(file_name, content)
+
+
+def _get_report_key(day: datetime.date, good_type: GoodsType, data_version: str) -> str:
+    """Функция возвращает ключ отчета за день в кэше отчетов. Пустая строка, если отчет кэшировать нельзя: день
+    еще не закончился или не удалось узнать версию таблицы соответствий ЕГАИС (data_version)."""
+    if day >= datetime.date.today():
+        return ''
+    if not data_version:
+        return ''
+    start_period = datetime.datetime.combine(day, datetime.time())
+    return get_report_key(ms_urls.GEO_SHOP_ID, *ms_urls.get_period_bounds(start_period, start_period),
+                          good_type.name, data_version)
 
-    if file:
-        if file != '':
-            # Отправляем файл
-            bot.send_message(message.chat.id, 'Касатики, вот файл с продажами за вчера.')
-            bot.send_document(message.chat.id, open(file, 'rb'))
-            logger.debug(f'Отправили файл в чат {file}')
-            # удаляем отправленный файл с диска
-            utils.file_utils.remove_file(file)
-        else:
-            bot.send_message(message.chat.id, 'Не удалось подготовить файл')
-            logger.debug('Не удалось подготовить файл: нет имени файла')
-    else:
-        bot.send_message(message.chat.id, 'Не удалось подготовить файл')
+
+def _send_sales_file(chat_id: int, future: 'Future[Optional[Report]]') -> None:
+    """Функция отправляет в чат файл, подготовленный _build_sales_file. Если отчет уже отправлялся, документ
+    отправляется по file_id, без повторной загрузки файла в Telegram. Чаты, ожидающие один отчет, отправляются
+    одновременно, поэтому файл загружает первая отправка, а остальные ждут ее file_id."""
+    try:
+        report = future.result()
+    except Exception:
+        logger.exception('Не удалось подготовить файл')
+        report = None
+
+    if report is None:
+        bot.send_message(chat_id, 'Не удалось подготовить файл')
         logger.error('Не удалось подготовить файл')
+        return
+
+    # Отправляем файл
+    bot.send_message(chat_id, 'Касатики, вот файл с продажами за вчера.')
+    with report.upload_lock:
+        if not report.file_id:
+            _upload_report(chat_id, report)
+            return
+    try:
+        bot.send_document(chat_id, report.file_id)
+        logger.debug(f'Отправили файл {report.file_name} в чат {chat_id} по file_id')
+        return
+    except telebot.apihelper.ApiException:
+        logger.exception(f'Не удалось отправить файл {report.file_name} по file_id, загружаем заново')
+    _upload_report(chat_id, report)
+
+
+def _upload_report(chat_id: int, report: Report) -> None:
+    """Функция загружает файл отчета в чат и сохраняет file_id, который вернул Telegram."""
+    sent = bot.send_document(chat_id, report.content, visible_file_name=report.file_name)
+    if sent.document is not None:
+        report_cache.set_file_id(report, sent.document.file_id)
+    logger.debug(f'Отправили файл {report.file_name} в чат {chat_id}')
+
+
+def _log_send_error(future: 'Future[None]') -> None:
+    """Функция записывает в лог ошибку отправки файла в пуле отправки, иначе она теряется в Future."""
+    if future.cancelled():
+        return
+    error = future.exception()
+    if error is not None:
+        logger.error('Не удалось отправить файл', exc_info=error)
 
 
 def run() -> None:
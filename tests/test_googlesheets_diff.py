@@ -0,0 +1,55 @@
+"""Тесты вычисления разницы между строками листа GoogleSheets и новыми данными."""
+from googledrive.googlesheets_diff import get_sheet_diff
+
+# Ключевой столбец - код ЕГАИС, при записи он помечается апострофом как текст
+KEY_INDEX = 2
+WIDTH = 4
+
+
+def test_insert_change_delete():
+    """Изменение пишется на место строки, удаленная строка освобождается под новую."""
+    current = [
+        ['Пивоварня 1', 'Пиво 1', '0001', 'Светлое'],
+        ['Пивоварня 2', 'Пиво 2', '0002', 'Темное'],
+        ['Пивоварня 3', 'Пиво 3', '0003', 'Нефильтрованное'],
+    ]
+    data = [
+        ('Пивоварня 1', 'Пиво 1', "'0001", 'Светлое'),
+        ('Пивоварня 3', 'Пиво 3', "'0003", 'Фильтрованное'),
+        ('Пивоварня 4', 'Пиво 4', "'0004", 'Сидр'),
+    ]
+    diff = get_sheet_diff(current, data, KEY_INDEX, WIDTH)
+
+    assert (diff.inserted, diff.changed, diff.deleted) == (1, 1, 1)
+    assert diff.updates == {
+        1: ['Пивоварня 4', 'Пиво 4', "'0004", 'Сидр'],
+        2: ['Пивоварня 3', 'Пиво 3', "'0003", 'Фильтрованное'],
+    }
+    assert diff.rows[1] == ['Пивоварня 4', 'Пиво 4', '0004', 'Сидр']
+    assert diff.get_ranges() == [(1, [diff.updates[1], diff.updates[2]])]
+
+
+def test_key_prefix_not_changed():
+    """Апостроф перед ключом и значениями не считается изменением строки."""
+    current = [['Пивоварня 1', 'Пиво 1', '0001', '0.5']]
+    data = [('Пивоварня 1', 'Пиво 1', "'0001", "'0.5")]
+    diff = get_sheet_diff(current, data, KEY_INDEX, WIDTH)
+
+    assert not diff.updates
+    assert (diff.inserted, diff.changed, diff.deleted) == (0, 0, 0)
+
+
+def test_insert_appended_and_deleted_blanked():
+    """Новые строки без свободных строк добавляются в конец, удаленные без замены очищаются."""
+    current = [
+        ['Пивоварня 1', 'Пиво 1', '0001', ''],
+        ['Пивоварня 2', 'Пиво 2', '0002', ''],
+    ]
+    diff = get_sheet_diff(current, [('Пивоварня 2', 'Пиво 2', "'0002")], KEY_INDEX, WIDTH)
+    assert diff.updates == {0: ['', '', '', '']}
+    assert diff.deleted == 1
+
+    data = [row[:2] + ["'" + row[2]] for row in current] + [('Пивоварня 5', 'Пиво 5', "'0005")]
+    diff = get_sheet_diff(current, data, KEY_INDEX, WIDTH)
+    assert diff.updates == {2: ['Пивоварня 5', 'Пиво 5', "'0005", '']}
+    assert len(diff.rows) == 3
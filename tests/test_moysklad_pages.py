@@ -0,0 +1,107 @@
+"""Тесты параллельного получения страниц коллекции МойСклад (MoySklad._iter_pages) с локального сервера, который
+отвечает как МойСклад."""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterator, Optional, Set
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+import requests
+
+# Модуль МойСклад читает настройки доступа при импорте
+pytest.importorskip('privatedata.moysklad_privatedata')
+
+import moysklad.moysklad_urls as ms_urls  # noqa: E402
+from moysklad.moysklad_class_lib import MoySklad  # noqa: E402
+from moysklad.moysklad_client import MoySkladClient  # noqa: E402
+from moysklad.moysklad_ratelimit import RateLimiter  # noqa: E402
+
+# Размер коллекции и страницы: последняя страница неполная
+COLLECTION_SIZE = 1234
+PAGE_LIMIT = 100
+
+
+class CollectionHandler(BaseHTTPRequestHandler):
+    """Обработчик запросов коллекции. Страницы отдаются с задержкой, обратной смещению, чтобы поздние страницы
+    приходили раньше ранних."""
+
+    # Смещения, на которые сервер отвечает ошибкой
+    failed_offsets: Set[int] = set()
+
+    def do_GET(self) -> None:
+        query = parse_qs(urlparse(self.path).query)
+        offset = int(query.get('offset', ['0'])[0])
+        limit = int(query.get('limit', [str(PAGE_LIMIT)])[0])
+        if offset in self.failed_offsets:
+            self.send_error(400)
+            return
+        time.sleep(0.01 * ((COLLECTION_SIZE - offset) // limit % 4))
+        body = json.dumps({
+            'meta': {'size': COLLECTION_SIZE, 'limit': limit, 'offset': offset},
+            'rows': [{'id': index} for index in range(offset, min(offset + limit, COLLECTION_SIZE))],
+        }).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server() -> Iterator[ThreadingHTTPServer]:
+    CollectionHandler.failed_offsets = set()
+    http_server = ThreadingHTTPServer(('127.0.0.1', 0), CollectionHandler)
+    thread = threading.Thread(target=http_server.serve_forever, daemon=True)
+    thread.start()
+    yield http_server
+    http_server.shutdown()
+    http_server.server_close()
+
+
+def get_url(http_server: ThreadingHTTPServer, limit: Optional[int] = PAGE_LIMIT) -> ms_urls.Url:
+    host, port = http_server.server_address[:2]
+    return ms_urls.Url(f'http://{host}:{port}/entity/retaildemand', {'limit': str(limit)})
+
+
+def get_moysklad() -> MoySklad:
+    # Без повторов и без общего ограничителя частоты запросов процесса
+    return MoySklad(client=MoySkladClient(max_retries=0, rate_limiter=RateLimiter()))
+
+
+def test_pages_in_offset_order(server):
+    """Все элементы приходят по одному разу и в порядке смещений, последняя страница неполная."""
+    pages = list(get_moysklad()._iter_pages(get_url(server), {}))
+
+    assert [page['meta']['offset'] for page in pages] == list(range(0, COLLECTION_SIZE, PAGE_LIMIT))
+    assert len(pages[-1]['rows']) == COLLECTION_SIZE % PAGE_LIMIT
+    assert [row['id'] for page in pages for row in page['rows']] == list(range(COLLECTION_SIZE))
+
+
+def test_rows_in_order(server):
+    rows = list(get_moysklad()._iter_rows(get_url(server, limit=1000), {}))
+
+    assert [row['id'] for row in rows] == list(range(COLLECTION_SIZE))
+
+
+def test_error_in_the_middle(server):
+    """Ошибка на странице в середине коллекции прерывает получение, неполные данные не отдаются молча."""
+    CollectionHandler.failed_offsets = {500}
+    ids = []
+    with pytest.raises(requests.RequestException):
+        for page in get_moysklad()._iter_pages(get_url(server), {}):
+            ids.extend(row['id'] for row in page['rows'])
+
+    # Страницы до ошибочной успевают прийти по порядку
+    assert ids == list(range(500))
+
+
+def test_error_on_first_page(server):
+    CollectionHandler.failed_offsets = {0}
+
+    with pytest.raises(requests.RequestException):
+        list(get_moysklad()._iter_pages(get_url(server), {}))
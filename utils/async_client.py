@@ -0,0 +1,33 @@
+"""Модуль описывает асинхронную обертку над сервисами (МойСклад, GoogleSheets, Контур.Маркет, Telegram бот).
+Методы сервиса вызываются через await и выполняются в отдельных потоках, поэтому независимые сетевые этапы разных
+сервисов выполняются одновременно."""
+import asyncio
+from typing import Any, Awaitable, Callable
+
+
+class AsyncClient:
+    """Класс описывает асинхронный вариант сервиса. Вызов await client.method(...) выполняет client.method(...)
+    в потоке (asyncio.to_thread), не блокируя цикл событий.
+
+    HTTP клиенты сервисов остаются синхронными, поэтому пул соединений, повторы запросов и ограничение частоты
+    запросов МойСклад общие для синхронного и асинхронного кода. Атрибут сервиса получается тоже в потоке: если сервис
+    еще не подключен (см. utils.registry.LazyClient), подключение не блокирует цикл событий.
+    Обертка дает доступ только к методам сервиса. Поля читаются у самого сервиса.
+    """
+
+    __slots__ = ('_client',)
+
+    def __init__(self, client: Any) -> None:
+        self._client = client
+
+    def __getattr__(self, item: str) -> Callable[..., Awaitable[Any]]:
+        client = self._client
+
+        async def call(*args: Any, **kwargs: Any) -> Any:
+            return await asyncio.to_thread(lambda: getattr(client, item)(*args, **kwargs))
+
+        call.__name__ = item
+        return call
+
+    def __repr__(self) -> str:
+        return f'AsyncClient({self._client!r})'
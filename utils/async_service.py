@@ -0,0 +1,48 @@
+"""Модуль описывает одновременный запуск заданий сервиса (см. utils.service). Задания выполняются в потоках
+(asyncio.to_thread), поэтому запуск по расписанию длится примерно столько, сколько самое долгое задание, а не сумму
+всех заданий. Логика заданий описана только в utils.service."""
+import asyncio
+import logging
+from typing import List
+
+import utils.service as service
+from moysklad.moysklad_class_lib import ms
+from utils.registry import GOOGLESHEETS, MOYSKLAD, registry
+
+logger = logging.getLogger('main_logger')
+
+
+async def send_sales_file_to_telegram(chat_id: int) -> bool:
+    """Функция отправки заполненного файла с продажами в телеграм чат, см. service.send_sales_file_to_telegram.
+    Таблица соответствий ЕГАИС запрашивается из GoogleSheets одновременно с продажами из МойСклад.
+
+    :param chat_id: id телеграм чата, в который отправляется файл.
+    """
+    # Подключаемся к нужным сервисам параллельно
+    await registry.connect_async(MOYSKLAD, GOOGLESHEETS)
+
+    # Таблица соответствий нужна отчету только после получения продаж. Отчет возьмет ее из кэша
+    result, _ = await asyncio.gather(
+        asyncio.to_thread(service.send_sales_file_to_telegram, chat_id),
+        asyncio.to_thread(ms.egais_mapping.get),
+    )
+    return result
+
+
+async def update_goooglesheets_egais_assortment(chat_id: int) -> bool:
+    """Функция обновления листа ЕГАИС наименований, см. service.update_goooglesheets_egais_assortment."""
+    return await asyncio.to_thread(service.update_goooglesheets_egais_assortment, chat_id)
+
+
+async def run_jobs(chat_id: int) -> List[bool]:
+    """Функция одновременно запускает все задания по расписанию.
+
+    :param chat_id: id телеграм чата, в который задания отправляют результат.
+    :return: Результаты заданий в порядке запуска. Если задание завершилось исключением, его результат False.
+    """
+    jobs = (send_sales_file_to_telegram, update_goooglesheets_egais_assortment)
+    results = await asyncio.gather(*(job(chat_id) for job in jobs), return_exceptions=True)
+    for job, result in zip(jobs, results):
+        if isinstance(result, BaseException):
+            logger.error(f'Задание {job.__name__} завершилось с ошибкой: {result!r}')
+    return [result is True for result in results]
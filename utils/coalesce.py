@@ -0,0 +1,40 @@
+"""Модуль описывает объединение одинаковых одновременных запросов (single flight). Пока запрос с ключом выполняется,
+повторные запросы с тем же ключом не запускают вычисление заново, а получают результат первого."""
+import threading
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable
+
+
+@dataclass
+class SingleFlight:
+    """Класс описывает объединение одинаковых запросов. Вычисления выполняются в пуле executor, поэтому количество
+    одновременных вычислений ограничено размером пула, а вызывающий поток не блокируется."""
+
+    # Пул, в котором выполняются вычисления
+    executor: Executor
+    # Выполняющиеся вычисления по ключу запроса
+    _futures: Dict[Hashable, 'Future[Any]'] = field(default_factory=dict, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def submit(self, key: Hashable, func: Callable[..., Any], *args: Any, **kwargs: Any) -> 'Future[Any]':
+        """Метод запускает func(*args, **kwargs) в пуле, если вычисление с ключом key еще не выполняется.
+
+        :param key: Ключ запроса. Запросы с одинаковым ключом должны давать одинаковый результат.
+        :return: Future вычисления. Для одинаковых одновременных запросов - один и тот же.
+        """
+        with self._lock:
+            future = self._futures.get(key)
+            if future is not None:
+                return future
+            future = self.executor.submit(func, *args, **kwargs)
+            self._futures[key] = future
+        # Если вычисление уже завершилось, callback выполнится сразу, в этом потоке, поэтому добавляется вне lock
+        future.add_done_callback(lambda done: self._forget(key, done))
+        return future
+
+    def _forget(self, key: Hashable, future: 'Future[Any]') -> None:
+        """Метод удаляет завершенное вычисление. Следующий запрос с ключом key запустит вычисление заново."""
+        with self._lock:
+            if self._futures.get(key) is future:
+                del self._futures[key]
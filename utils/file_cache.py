@@ -0,0 +1,80 @@
+"""Модуль для работы с кэшем на диске. Файлы кэша хранятся в папке /MoySklad_Sync/cache и переживают перезапуск
+процесса (бота, задания по расписанию)."""
+import json
+import os
+import tempfile
+from typing import Any, Optional
+
+# Папка для файлов кэша
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'cache')
+
+
+def get_cache_path(file_name: str) -> str:
+    """Функция возвращает путь к файлу в папке кэша, создавая папку при необходимости."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    return os.path.join(CACHE_DIR, file_name)
+
+
+def read_json(file_name: str) -> Optional[Any]:
+    """Функция читает данные из json файла кэша.
+
+    :param file_name: Имя файла в папке кэша.
+    :return: Прочитанные данные. None, если файла нет или он поврежден.
+    """
+    try:
+        with open(get_cache_path(file_name), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def read_bytes(file_name: str) -> Optional[bytes]:
+    """Функция читает содержимое файла кэша.
+
+    :param file_name: Имя файла в папке кэша.
+    :return: Содержимое файла. None, если файла нет.
+    """
+    try:
+        with open(get_cache_path(file_name), 'rb') as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+def write_json(file_name: str, data: Any, private: bool = False) -> None:
+    """Функция записывает данные в json файл кэша. Запись атомарная: данные пишутся во временный файл, который
+    затем заменяет файл кэша, поэтому параллельный процесс никогда не прочитает файл наполовину.
+
+    :param file_name: Имя файла в папке кэша.
+    :param data: Данные для записи.
+    :param private: True - файл доступен только владельцу (для токенов и т.п.).
+    """
+    write_bytes(file_name, json.dumps(data, ensure_ascii=False).encode('utf-8'), private)
+
+
+def write_bytes(file_name: str, data: bytes, private: bool = False) -> None:
+    """Функция атомарно записывает содержимое файла кэша, см. write_json.
+
+    :param file_name: Имя файла в папке кэша.
+    :param data: Содержимое файла.
+    :param private: True - файл доступен только владельцу.
+    """
+    path = get_cache_path(file_name)
+    descriptor, temp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=f'.{file_name}.')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(data)
+        if not private:
+            os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+def remove(file_name: str) -> None:
+    """Функция удаляет файл кэша, если он есть."""
+    try:
+        os.remove(get_cache_path(file_name))
+    except FileNotFoundError:
+        pass
@@ -1,9 +1,13 @@
 """Модуль для работы с файлами. Сохранение данных в файл, удаление файлов."""
 import datetime
+import io
 import os
-from typing import Any, List
+from typing import Any, Iterable, List
 
-import pandas as pd
+from openpyxl import Workbook
+
+# Имя листа в файле списаний
+EXCEL_SHEET_NAME = 'Списания ЕГАИС'
 
 
 def remove_file(file_name: str) -> None:
@@ -12,6 +16,39 @@ def remove_file(file_name: str) -> None:
         os.remove(file_name)
 
 
+def get_excel_file_name(file_name: str, date: datetime.datetime, add_date: bool = True) -> str:
+    """Функция возвращает имя файла excel.
+
+    :param file_name: Имя файла без расширения.
+    :param date: Дата, которая добавляется к имени файла.
+    :param add_date: По умолчанию True - к имени файла будет добавлена дата (ИМЯ_ФАЙЛА_ГОД_МЕСЯЦ_ДЕНЬ.xlsx)
+    """
+    if add_date:
+        return f'{file_name}_{str(date.date())}.xlsx'
+    return file_name
+
+
+def build_excel(data: Iterable[Any], sheet_name: str = EXCEL_SHEET_NAME) -> bytes:
+    """Функция строит файл excel в памяти.
+
+    :param data: Строки таблицы. Элемент - объект со свойством to_tuple (например, Good).
+    :param sheet_name: Имя листа.
+    :return: Содержимое файла .xlsx.
+    """
+    # В конечном итоге мне нужен именно excel, т.к. продавцы, которые пользуют сервис, скачивают файл из телеги,
+    # люди не далекие. Открыть Excel они могут, а вот делать доп. действия с csv будет сложно объяснить и инструкции
+    # тут не помогут.
+    # Книга в режиме write-only пишет строки сразу в поток, не держа в памяти объекты ячеек, а файл собирается
+    # в буфере, без временного файла на диске
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(sheet_name)
+    for good in data:
+        sheet.append(good.to_tuple)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    return buffer.getvalue()
+
+
 def save_to_excel(file_name: str, data: List[Any], date: datetime.datetime, add_date: bool = True) -> str:
     """Функция сохранения в файл excel.
 
@@ -24,19 +61,10 @@ def save_to_excel(file_name: str, data: List[Any], date: datetime.datetime, add_
     if not data:
         return ''
 
-    if add_date:
-        file_name = f'{file_name}_{str(date.date())}.xlsx'
-
-    # В конечном итоге мне нужен именно excel, т.к. продавцы, которые пользуют сервис, скачивают файл из телеги,
-    # люди не далекие. Открыть Excel они могут, а вот делать доп. действия с csv будет сложно объяснить и инструкции
-    # тут не помогут.
-    # Да, ставить pandas, и делать DataFrame для этих целей не очень-то целесообразно. Но меня устроила компактность
-    # кода.
-
+    file_name = get_excel_file_name(file_name, date, add_date)
     # пишем данные в файл
-
-    df = pd.DataFrame([good.to_tuple for good in data])
-    df.to_excel(file_name, sheet_name='Списания ЕГАИС', index=False, header=False)
+    with open(file_name, 'wb') as file:
+        file.write(build_excel(data))
     return file_name
 
 
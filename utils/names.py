@@ -0,0 +1,39 @@
+"""Модуль нормализации наименований товаров. Различных товаров в продажах и в таблице соответствий ЕГАИС несколько
+сотен, а позиций - сотни тысяч, поэтому результаты нормализации кэшируются по исходной строке, а сами наименования
+интернируются: одинаковые наименования - один объект строки, повторная нормализация - одно обращение к словарю."""
+import sys
+from functools import lru_cache
+
+# Максимальное количество наименований в каждом кэше
+NAME_CACHE_SIZE = 16384
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def convert_name(name: str) -> str:
+    """Функция преобразует строку наименования вида
+    4Пивовара - Black Jesus White Pepper (Porter - American. OG 17, ABV 6.7%, IBU 69)
+    к строке вида
+    4Пивовара - Black Jesus White Pepper.
+
+    :param name: Наименование товара в сервисе МойСклад.
+    :return: Коммерческое наименование (интернированная строка).
+    """
+    return sys.intern(name.split(' (')[0].replace('  ', ' ').strip())
+
+
+@lru_cache(maxsize=NAME_CACHE_SIZE)
+def get_name_key(name: str) -> str:
+    """Функция возвращает ключ для поиска по коммерческому наименованию - наименование в нижнем регистре.
+    Регистр не учитывается, т.к. в сервисе товар может храниться как Aircraft - Рождественский Эль, а в таблице
+    ЕГАИС как Aircraft - Рождественский эль.
+
+    :param name: Коммерческое наименование.
+    :return: Ключ (интернированная строка).
+    """
+    return sys.intern(name.lower())
+
+
+def clear_cache() -> None:
+    """Функция очищает кэши наименований."""
+    convert_name.cache_clear()
+    get_name_key.cache_clear()
@@ -0,0 +1,103 @@
+"""Модуль описывает реестр сервисов (МойСклад, GoogleSheets, Контур.Маркет), которые подключаются при первом
+обращении, а не при импорте модуля."""
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, TypeVar, cast
+
+# Логгер для утилит
+logger = logging.getLogger('utils')
+
+# Имена сервисов в реестре
+MOYSKLAD = 'moysklad'
+GOOGLESHEETS = 'googlesheets'
+KONTURMARKET = 'konturmarket'
+
+T = TypeVar('T')
+
+
+class LazyClient:
+    """Класс описывает заместителя сервиса. При первом обращении к любому атрибуту заместитель подключает сервис
+    через реестр и дальше передает все обращения ему."""
+
+    __slots__ = ('_registry', '_name')
+
+    def __init__(self, registry: 'ClientRegistry', name: str) -> None:
+        object.__setattr__(self, '_registry', registry)
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, item: str) -> Any:
+        return getattr(self._registry.get(self._name), item)
+
+    def __setattr__(self, key: str, value: Any) -> None:
+        setattr(self._registry.get(self._name), key, value)
+
+    def __repr__(self) -> str:
+        return f'LazyClient({self._name!r})'
+
+
+@dataclass
+class ClientRegistry:
+    """Класс описывает реестр сервисов. Сервис регистрируется функцией подключения, которая вызывается один раз,
+    при первом обращении к сервису."""
+
+    _factories: Dict[str, Callable[[], Any]] = field(default_factory=dict)
+    _clients: Dict[str, Any] = field(default_factory=dict)
+    _locks: Dict[str, threading.Lock] = field(default_factory=dict)
+    # Время подключения к каждому сервису, сек.
+    timings: Dict[str, float] = field(default_factory=dict)
+
+    def register(self, name: str, factory: Callable[[], T]) -> T:
+        """Метод регистрирует сервис.
+
+        :param name: Имя сервиса в реестре.
+        :param factory: Функция, создающая и подключающая сервис.
+        :return: Заместитель сервиса, который можно использовать как сам сервис.
+        """
+        self._factories[name] = factory
+        self._locks[name] = threading.Lock()
+        return cast(T, LazyClient(self, name))
+
+    def get(self, name: str) -> Any:
+        """Метод возвращает подключенный сервис, подключая его при первом обращении."""
+        if name in self._clients:
+            return self._clients[name]
+        with self._locks[name]:
+            if name not in self._clients:
+                start = time.perf_counter()
+                self._clients[name] = self._factories[name]()
+                self.timings[name] = time.perf_counter() - start
+                logger.debug(f'Подключились к сервису {name} за {self.timings[name]:.3f} сек.')
+        return self._clients[name]
+
+    def connect(self, *names: str) -> None:
+        """Метод подключает перечисленные сервисы. Если не подключенных сервисов больше одного, они подключаются
+        параллельно.
+
+        :param names: Имена сервисов в реестре.
+        """
+        pending = [name for name in names if name not in self._clients]
+        if len(pending) < 2:
+            for name in pending:
+                self.get(name)
+            return
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(pending)) as executor:
+            list(executor.map(self.get, pending))
+        logger.debug(f'Подключились к сервисам {", ".join(pending)} за {time.perf_counter() - start:.3f} сек.')
+
+    async def connect_async(self, *names: str) -> None:
+        """Метод подключает перечисленные сервисы параллельно, не блокируя цикл событий. См. connect.
+
+        :param names: Имена сервисов в реестре.
+        """
+        pending = [name for name in names if name not in self._clients]
+        await asyncio.gather(*(asyncio.to_thread(self.get, name) for name in pending))
+
+
+# Общий реестр сервисов
+registry = ClientRegistry()
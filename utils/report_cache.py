@@ -0,0 +1,128 @@
+"""Модуль описывает кэш готовых отчетов (xlsx). Отчет за закрытый период не меняется, поэтому хранится вместе с
+file_id, который Telegram вернул при первой отправке: повторный запрос отчета не обращается к МойСклад, не строит
+xlsx и не загружает файл в Telegram заново."""
+import hashlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+import utils.file_cache as file_cache
+
+# Файл с описанием отчетов в кэше
+REPORT_INDEX_FILE = 'reports.json'
+# Максимальное количество отчетов в кэше. При превышении удаляются самые старые
+MAX_REPORTS = 100
+# Версия формата отчета. Увеличивается при изменении содержимого xlsx, чтобы не отдавать отчеты старого формата
+REPORT_FORMAT_VERSION = 1
+
+
+def get_report_key(store_id: str, moment_from: str, moment_to: str, good_type: str, data_version: str) -> str:
+    """Функция возвращает ключ отчета в кэше.
+
+    :param store_id: id точки продаж.
+    :param moment_from: Начало периода отчета.
+    :param moment_to: Конец периода отчета.
+    :param good_type: Тип товаров отчета (GoodsType.name).
+    :param data_version: Версия данных, от которых зависит отчет, кроме продаж (таблица соответствий ЕГАИС и т.п.).
+    """
+    return '|'.join((str(REPORT_FORMAT_VERSION), store_id, moment_from, moment_to, good_type, data_version))
+
+
+@dataclass
+class Report:
+    """Класс описывает готовый отчет."""
+
+    file_name: str  # имя файла, которое видит получатель
+    content: bytes = field(repr=False)  # содержимое файла
+    file_id: str = ''  # file_id документа в Telegram, пустая строка, если отчет еще не отправлялся
+    key: str = ''  # ключ отчета в кэше, пустая строка, если отчет не кэшируется
+    # Блокировка загрузки файла в Telegram: файл загружается один раз, остальные отправки ждут file_id
+    upload_lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+
+@dataclass
+class ReportCache:
+    """Класс описывает кэш отчетов в памяти и на диске."""
+
+    max_reports: int = MAX_REPORTS
+    # Отчеты по ключу, загруженные в память
+    _reports: Dict[str, Report] = field(default_factory=dict, init=False, repr=False)
+    # Описание отчетов на диске по ключу: имя файла отчета, file_id, время добавления
+    _index: Dict[str, Dict[str, Any]] = field(default_factory=dict, init=False, repr=False)
+    _loaded: bool = field(default=False, init=False, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False)
+
+    def get(self, key: str) -> Optional[Report]:
+        """Метод возвращает отчет по ключу. None, если отчета нет в кэше."""
+        with self._lock:
+            self._load()
+            report = self._reports.get(key)
+            if report is not None:
+                return report
+            entry = self._index.get(key)
+            if entry is None:
+                return None
+            content = file_cache.read_bytes(entry['data'])
+            if content is None:
+                del self._index[key]
+                return None
+            report = Report(entry['file_name'], content, entry.get('file_id', ''), key)
+            self._reports[key] = report
+            return report
+
+    def put(self, key: str, file_name: str, content: bytes) -> Report:
+        """Метод добавляет отчет в кэш.
+
+        :param key: Ключ отчета, см. get_report_key.
+        :param file_name: Имя файла, которое видит получатель.
+        :param content: Содержимое файла.
+        """
+        data_file = f'report_{hashlib.sha1(key.encode()).hexdigest()}.xlsx'
+        file_cache.write_bytes(data_file, content)
+        report = Report(file_name, content, '', key)
+        with self._lock:
+            self._load()
+            self._reports[key] = report
+            self._index[key] = {'file_name': file_name, 'file_id': '', 'data': data_file, 'created': time.time()}
+            self._evict()
+            self._save()
+        return report
+
+    def set_file_id(self, report: Report, file_id: str) -> None:
+        """Метод сохраняет file_id, который Telegram вернул при отправке отчета."""
+        report.file_id = file_id
+        if not report.key:
+            return
+        with self._lock:
+            self._load()
+            entry = self._index.get(report.key)
+            if entry is not None:
+                entry['file_id'] = file_id
+                self._save()
+
+    def _evict(self) -> None:
+        """Метод удаляет самые старые отчеты сверх max_reports. Вызывается под self._lock."""
+        extra = len(self._index) - self.max_reports
+        if extra <= 0:
+            return
+        for key in sorted(self._index, key=lambda item: self._index[item]['created'])[:extra]:
+            file_cache.remove(self._index.pop(key)['data'])
+            self._reports.pop(key, None)
+
+    def _load(self) -> None:
+        """Метод загружает описание отчетов с диска при первом обращении. Вызывается под self._lock."""
+        if self._loaded:
+            return
+        self._loaded = True
+        cached = file_cache.read_json(REPORT_INDEX_FILE)
+        if isinstance(cached, dict):
+            self._index = cached
+
+    def _save(self) -> None:
+        """Метод сохраняет описание отчетов на диск. Вызывается под self._lock."""
+        file_cache.write_json(REPORT_INDEX_FILE, self._index)
+
+
+# Общий кэш отчетов
+report_cache = ReportCache()
@@ -1,14 +1,32 @@
 """Модуль описывает функции для работы сервиса."""
 import datetime
-from typing import List
+from typing import Dict, List, Tuple
 
 import googledrive.googlesheets_vars as gs_vars
 from googledrive.googledrive_class_lib import googlesheets
-import utils.file_utils
+from konturmarket.egais_matcher import EgaisCandidate
 from konturmarket.konturmarket_class_lib import GoodEGAIS
 from konturmarket.konturmarket_class_lib import kmarket
-from moysklad.moysklad_class_lib import ms, GoodsType
+from moysklad.moysklad_class_lib import ms, Good, GoodsType
 from tbot.tbot import bot
+from utils.registry import GOOGLESHEETS, KONTURMARKET, MOYSKLAD, registry
+
+# Сообщения в телеграм чат
+SALES_FILE_SENT = 'Касатики, вот файл с продажами за сегодня.'
+SALES_FILE_FAILED = 'Не удалось подготовить файл. Возможно сегодня еще и не было продаж!'
+EGAIS_ASSORTMENT_UPDATED = 'Касатики, обновил ЕГАИС справочник'
+EGAIS_ASSORTMENT_NOT_UPDATED = 'Касатики, не смог обновить ЕГАИС справочник. Простите ;('
+EGAIS_ASSORTMENT_NOT_CHANGED = 'Касатики, ЕГАИС справочник не изменился'
+UNMATCHED_GOODS = 'Касатики, этих товаров нет в таблице соответствий ЕГАИС. Похожие ЕГАИС наименования:'
+
+# Количество товаров без ЕГАИС наименования и кандидатов на товар в сообщении (сообщение Telegram до 4096 символов)
+UNMATCHED_GOODS_LIMIT = 20
+UNMATCHED_CANDIDATES_LIMIT = 3
+
+# Ключевой столбец листа ЕГАИС наименований (код алкогольной продукции), по нему сравниваются строки листа
+EGAIS_ASSORTMENT_KEY_COLUMN = 2
+# Имя потребителя изменений справочника ЕГАИС наименований, см. KonturMarket.get_egais_assortment_diff
+EGAIS_ASSORTMENT_CONSUMER = 'googlesheets_egais_assortment'
 
 
 def send_sales_file_to_telegram(chat_id: int) -> bool:
@@ -16,56 +34,130 @@ def send_sales_file_to_telegram(chat_id: int) -> bool:
 
     :param chat_id: id телеграм чата, в который отправляется файл.
     """
-    # Получаем файл с продажами за сегодня
-    file_name: str = ms.save_to_file_retail_demand_by_period(
-        good_type=GoodsType.alco,
-        start_period=datetime.datetime.today(),
-        end_period=None,
-    )
-
-    if file_name != '':
-        bot.send_message(chat_id, 'Касатики, вот файл с продажами за сегодня.')
-        # Отправляем файл.
-        bot.send_document(chat_id, open(file_name, 'rb'))
-        # Удаляем отправленный файл с диска.
-        utils.file_utils.remove_file(file_name)
+    # Подключаемся к нужным сервисам параллельно
+    registry.connect(MOYSKLAD, GOOGLESHEETS)
+
+    # Получаем продажи за сегодня с заполненными ЕГАИС наименованиями
+    start_period = datetime.datetime.today()
+    sold_goods = ms.get_retail_demand_by_period(good_type=GoodsType.alco, start_period=start_period)
+
+    if sold_goods:
+        bot.send_message(chat_id, SALES_FILE_SENT)
+        # Файл строится в памяти, на диск не пишется
+        send_file(chat_id, *ms.get_report_file(GoodsType.alco, sold_goods, start_period))
+        send_unmatched_goods(chat_id, sold_goods)
         return True
     else:
-        bot.send_message(chat_id, 'Не удалось подготовить файл. Возможно сегодня еще и не было продаж!')
+        bot.send_message(chat_id, SALES_FILE_FAILED)
     return False
 
 
+def send_unmatched_goods(chat_id: int, sold_goods: List[Good]) -> None:
+    """Функция отправляет в телеграм чат проданные товары, которых нет в таблице соответствий ЕГАИС, с кандидатами
+    в ЕГАИС наименования. Если все товары сопоставлены, ничего не отправляется."""
+    message = get_unmatched_goods_message(get_egais_name_candidates(sold_goods))
+    if message:
+        bot.send_message(chat_id, message)
+
+
+def send_file(chat_id: int, file_name: str, content: bytes) -> None:
+    """Функция отправляет файл в телеграм чат.
+
+    :param file_name: Имя файла, которое видит получатель.
+    :param content: Содержимое файла.
+    """
+    bot.send_document(chat_id, content, visible_file_name=file_name)
+
+
 def update_goooglesheets_egais_assortment(chat_id: int) -> bool:
     """Функция обновления листа ЕГАИС наименований."""
+    # Подключаемся к нужным сервисам параллельно
+    registry.connect(KONTURMARKET, GOOGLESHEETS)
+
     # Проверяем получилось залогиниться в сервисе
     if not kmarket.connection_OK:
         return False
-    # Получаем список ЕГАИС наименований
-    egais_goods: List[GoodEGAIS] = kmarket.get_egais_assortment()
-    if egais_goods:
-        # Сохранять в GoogleSheet будем только фасованный товар, тот что имеет значение аттрибута capacity
-        data = [
-            (
-                egais_good.brewery.name,
-                egais_good.name,
-                f"'{egais_good.alco_code}",
-                egais_good.get_description(),
-            )
-            for egais_good in egais_goods
-            if egais_good.capacity is not None
-        ]
-
-        # Записываем данные в GoogleSheets
-        result = googlesheets.send_data(data=data,
-                                        spreadsheets_id=gs_vars.SPREEDSHEET_ID_EGAIS,
-                                        list_name=gs_vars.LIST_NAME_EGAIS_ASSORTMNET,
-                                        list_range=f'{gs_vars.FIRST_CELL_EGAIS_ASSORTMNET}:'
-                                                   f'{gs_vars.LAST_COLUMN_EGAIS_ASSORTMNET}'
-                                                   f'{len(egais_goods) + 1}',
-                                        )
-        if result:
-            bot.send_message(chat_id, 'Касатики, обновил ЕГАИС справочник')
-            return True
-        else:
-            bot.send_message(chat_id, 'Касатики, не смог обновить ЕГАИС справочник. Простите ;(')
-            return False
+    # Получаем изменения справочника ЕГАИС наименований с прошлого обновления листа
+    diff = kmarket.get_egais_assortment_diff(EGAIS_ASSORTMENT_CONSUMER)
+    if diff is None:
+        return False
+    if not diff and not googlesheets.is_sheet_changed(gs_vars.SPREEDSHEET_ID_EGAIS, gs_vars.LIST_NAME_EGAIS_ASSORTMNET):
+        # Справочник и лист не изменились, лист обновлять не нужно
+        bot.send_message(chat_id, EGAIS_ASSORTMENT_NOT_CHANGED)
+        return True
+    # Получаем список ЕГАИС наименований из снимка, полученного вместе с изменениями
+    egais_goods: List[GoodEGAIS] = kmarket.get_egais_assortment(refresh=False)
+    if not egais_goods:
+        return False
+
+    data = get_egais_assortment_sheet(egais_goods)
+    # Записываем в GoogleSheets только изменившиеся строки
+    result = googlesheets.send_data_diff(data=data,
+                                         spreadsheets_id=gs_vars.SPREEDSHEET_ID_EGAIS,
+                                         list_name=gs_vars.LIST_NAME_EGAIS_ASSORTMNET,
+                                         first_cell=gs_vars.FIRST_CELL_EGAIS_ASSORTMNET,
+                                         last_column=gs_vars.LAST_COLUMN_EGAIS_ASSORTMNET,
+                                         key_column=EGAIS_ASSORTMENT_KEY_COLUMN,
+                                         )
+    if result:
+        kmarket.commit_egais_assortment_diff(diff)
+        bot.send_message(chat_id, EGAIS_ASSORTMENT_UPDATED)
+        return True
+    bot.send_message(chat_id, EGAIS_ASSORTMENT_NOT_UPDATED)
+    return False
+
+
+def get_egais_assortment_sheet(egais_goods: List[GoodEGAIS]) -> List[Tuple[str, str, str, str]]:
+    """Функция готовит строки листа ЕГАИС наименований для записи в GoogleSheets.
+
+    :param egais_goods: Справочник ЕГАИС наименований из Контур.Маркет.
+    :return: Строки (пивоварня, наименование, код, описание).
+    """
+    # Сохранять в GoogleSheet будем только фасованный товар, тот что имеет значение аттрибута capacity
+    return [
+        (
+            egais_good.brewery.name,
+            egais_good.name,
+            f"'{egais_good.alco_code}",
+            egais_good.get_description(),
+        )
+        for egais_good in egais_goods
+        if egais_good.capacity is not None
+    ]
+
+
+def get_egais_name_candidates(sold_goods: List[Good]) -> Dict[str, List[EgaisCandidate]]:
+    """Функция подбирает кандидатов в ЕГАИС наименования из справочника Контур.Маркет для проданных товаров, которых
+    нет в таблице соответствий (egais_name не заполнено). Индекс справочника строится один раз на версию справочника,
+    см. KonturMarket.get_egais_matcher.
+
+    :return: Словарь. Ключ - коммерческое наименование, значение - кандидаты по убыванию похожести.
+        Пустой словарь, если все товары сопоставлены или справочник получить не удалось.
+    """
+    unmatched = [good.commercial_name for good in sold_goods if not good.egais_name]
+    if not unmatched:
+        return {}
+
+    registry.connect(KONTURMARKET)
+    if not kmarket.connection_OK:
+        return {}
+    matcher = kmarket.get_egais_matcher()
+    if matcher is None:
+        return {}
+    return matcher.match_many(unmatched[:UNMATCHED_GOODS_LIMIT], limit=UNMATCHED_CANDIDATES_LIMIT)
+
+
+def get_unmatched_goods_message(candidates: Dict[str, List[EgaisCandidate]]) -> str:
+    """Функция готовит сообщение о товарах без ЕГАИС наименования, см. get_egais_name_candidates.
+
+    :return: Текст сообщения. Пустая строка, если товаров без ЕГАИС наименования нет.
+    """
+    if not candidates:
+        return ''
+    lines = [UNMATCHED_GOODS]
+    for commercial_name, egais_candidates in candidates.items():
+        lines.append(f'\n{commercial_name}')
+        lines.extend(f'  - {candidate.name} ({candidate.alco_code})' for candidate in egais_candidates)
+        if not egais_candidates:
+            lines.append('  - похожих нет')
+    return '\n'.join(lines)